@@ -0,0 +1,5 @@
+"""
+Socrates benchmarks. Generates synthetic blogs of a given size and times
+cold builds, no-op rebuilds and rebuilds after a single post has been
+edited. See ``python -m benchmarks.run --help``.
+"""
@@ -0,0 +1,38 @@
+"""
+Build a site once and print the measurements as JSON. Run in a fresh
+process by ``benchmarks.run`` so that peak memory use is per build.
+"""
+import sys
+import json
+import time
+import resource
+from optparse import OptionParser
+
+
+def main():
+    parser = OptionParser(usage="Usage: python -m benchmarks.build path")
+    parser.add_option('-j', '--jobs', type='int')
+    options, args = parser.parse_args()
+
+    from socrates import socrates
+
+    wall = time.time()
+    cpu = time.process_time()
+    socrates.Generator(args[0], silent=True, jobs=options.jobs)
+    wall = time.time() - wall
+    cpu = time.process_time() - cpu
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    workers = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    sys.stdout.write(json.dumps({
+        'wall': wall,
+        'cpu': cpu + workers.ru_utime + workers.ru_stime,
+        'peak_rss': own.ru_maxrss * scale,
+        'peak_rss_workers': workers.ru_maxrss * scale,
+    }) + '\n')
+
+
+if __name__ == '__main__':
+    main()
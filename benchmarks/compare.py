@@ -0,0 +1,37 @@
+"""
+Compare two benchmark result files.
+
+    $ python -m benchmarks.compare results/abc1234.json results/def5678.json
+"""
+import sys
+import json
+
+
+def load(path):
+    with open(path) as f:
+        data = json.load(f)
+    rows = {}
+    for row in data['results']:
+        rows[(row['theme'], row['posts'], row['scenario'])] = row
+    return data, rows
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.stderr.write(__doc__.strip() + '\n')
+        sys.exit(1)
+
+    old, old_rows = load(sys.argv[1])
+    new, new_rows = load(sys.argv[2])
+
+    print('%-8s %7s %-5s %10s %10s %8s' % (
+        'theme', 'posts', 'run', old['commit'], new['commit'], 'change'))
+    for key in sorted(set(old_rows) & set(new_rows)):
+        a = old_rows[key]['wall']
+        b = new_rows[key]['wall']
+        change = (b - a) / a * 100 if a else 0.0
+        print('%-8s %7d %-5s %9.2fs %9.2fs %+7.1f%%' % (key + (a, b, change)))
+
+
+if __name__ == '__main__':
+    main()
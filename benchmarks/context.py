@@ -0,0 +1,84 @@
+"""
+Measure the memory allocated for the template context of every render.
+
+    $ python -m benchmarks.context --posts 1000
+
+Builds a generated site once, then renders its index and a single post
+page under ``tracemalloc``. Reports the size of the context handed to
+the template renderer and the peak allocation of a whole render.
+"""
+import shutil
+import tempfile
+import tracemalloc
+from optparse import OptionParser
+
+from . import sitegen
+
+
+def context_size(generator, site, values, repeat):
+    """
+    Bytes allocated per context, averaged over ``repeat`` contexts.
+    """
+    contexts = []
+    before = tracemalloc.take_snapshot()
+    for i in range(repeat):
+        contexts.append(generator._v(site, values))
+    after = tracemalloc.take_snapshot()
+    total = sum(s.size_diff for s in after.compare_to(before, 'filename'))
+    # Don't count the list holding the contexts
+    return (total - len(contexts) * 8) / float(repeat)
+
+
+def render_peak(generator, template, site, values, repeat):
+    """
+    Largest peak allocation of ``repeat`` renders.
+    """
+    peak = 0
+    for i in range(repeat):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        generator.render(template, generator._v(site, values))
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+    return peak
+
+
+def main():
+    parser = OptionParser(usage="Usage: python -m benchmarks.context")
+    parser.add_option('-p', '--posts', type='int', default=1000,
+                      help="Number of posts. [default: %default]")
+    parser.add_option('-t', '--theme', default='jinja2',
+                      help="Theme to render. [default: %default]")
+    parser.add_option('-r', '--repeat', type='int', default=100,
+                      help="Renders per page. [default: %default]")
+    options, args = parser.parse_args()
+
+    from socrates import socrates
+
+    workdir = tempfile.mkdtemp(prefix='socrates-bench')
+    try:
+        site = sitegen.make_site(workdir, options.posts, options.theme)
+        generator = socrates.Generator(site, silent=True)
+        per = generator.SETTINGS['posts_per_page'] or len(generator.posts)
+        post = generator.posts[0]
+        post.contents  # Not part of the render
+        pages = [
+            ('index', generator.INDEX,
+             {'posts': generator.posts[:per], 'extra': True}),
+            ('single', generator.SINGLE, {'post': post}),
+        ]
+
+        tracemalloc.start()
+        for name, template, values in pages:
+            size = context_size(generator, generator.SETTINGS, values,
+                                options.repeat)
+            peak = render_peak(generator, template, generator.SETTINGS,
+                               values, options.repeat)
+            print('%-8s context %8.0f B   render peak %8.1f KB' % (
+                name, size, peak / 1024.0))
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Run the build benchmarks and store the results.
+
+    $ python -m benchmarks.run --posts 1000,10000 --theme default
+
+For every theme and site size this times a cold build (no deploy directory
+and no cache), a no-op rebuild and a rebuild after editing a single post.
+Each build runs in its own process. Results are written to
+``benchmarks/results/<commit>.json``; compare two runs with
+``python -m benchmarks.compare``.
+"""
+import os
+import sys
+import json
+import shutil
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from optparse import OptionParser
+
+from . import sitegen
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+RESULTS = os.path.join(HERE, 'results')
+
+SCENARIOS = ['cold', 'noop', 'edit']
+
+
+def git_commit():
+    try:
+        out = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                      cwd=ROOT, stderr=subprocess.STDOUT)
+        return out.decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def build(site, jobs=None):
+    cmd = [sys.executable, '-m', 'benchmarks.build', site]
+    if jobs is not None:
+        cmd.extend(['-j', str(jobs)])
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [p for p in [env.get('PYTHONPATH')] if p])
+    out = subprocess.check_output(cmd, cwd=ROOT, env=env)
+    return json.loads(out.decode('utf-8').strip().splitlines()[-1])
+
+
+def clean(site):
+    for name in ('deploy', '.socrates-cache'):
+        path = os.path.join(site, name)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+
+
+def edit(site, posts):
+    path = sitegen.post_path(site, posts // 2)
+    with open(path, 'a') as f:
+        f.write('\n\nOne more paragraph, added by the benchmark.\n')
+
+
+def run_scenarios(site, posts, jobs, repeat):
+    """
+    Yield ``(scenario, measurements)`` pairs, keeping the fastest of
+    ``repeat`` runs.
+    """
+    best = {}
+    for i in range(repeat):
+        clean(site)
+        runs = [('cold', build(site, jobs)), ('noop', build(site, jobs))]
+        edit(site, posts)
+        runs.append(('edit', build(site, jobs)))
+        for scenario, result in runs:
+            if scenario not in best or result['wall'] < best[scenario]['wall']:
+                best[scenario] = result
+    for scenario in SCENARIOS:
+        yield scenario, best[scenario]
+
+
+def main():
+    parser = OptionParser(usage="Usage: python -m benchmarks.run [options]")
+    parser.add_option('-p', '--posts', default='1000',
+                      help="Comma separated site sizes. [default: %default]")
+    parser.add_option('-t', '--theme', default='default,jinja2',
+                      help="Comma separated themes. [default: %default]")
+    parser.add_option('-j', '--jobs', type='int',
+                      help="Number of worker processes.")
+    parser.add_option('-r', '--repeat', type='int', default=1,
+                      help="Runs per scenario, the fastest is kept.")
+    parser.add_option('-d', '--directory',
+                      help="Where to generate the sites. [default: temp dir]")
+    parser.add_option('-o', '--output',
+                      help="Results file. [default: results/<commit>.json]")
+    options, args = parser.parse_args()
+
+    sizes = [int(n) for n in options.posts.split(',')]
+    themes = options.theme.split(',')
+    commit = git_commit()
+    workdir = options.directory or tempfile.mkdtemp(prefix='socrates-bench')
+
+    results = []
+    try:
+        for theme in themes:
+            for posts in sizes:
+                site = os.path.join(workdir, '%s-%d' % (theme, posts))
+                sitegen.make_site(site, posts, theme)
+                for scenario, m in run_scenarios(site, posts, options.jobs,
+                                                 options.repeat):
+                    row = dict(m, theme=theme, posts=posts, scenario=scenario)
+                    results.append(row)
+                    print('%-8s %7d %-5s %8.2fs %8.1f MB' % (
+                        theme, posts, scenario, m['wall'],
+                        max(m['peak_rss'], m['peak_rss_workers']) / 1e6))
+    finally:
+        if not options.directory:
+            shutil.rmtree(workdir)
+
+    output = options.output or os.path.join(RESULTS, '%s.json' % commit)
+    if not os.path.exists(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    with open(output, 'w') as f:
+        f.write(json.dumps({
+            'commit': commit,
+            'date': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'jobs': options.jobs,
+            'results': results,
+        }, indent=4, sort_keys=True))
+    print('Results saved to %s' % output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Synthetic blog generator. Posts are a deterministic mix of Markdown,
+reStructuredText and textile with code blocks, lists, quotes and
+categories, laid out with one of the themes shipped with Socrates.
+"""
+import os
+import random
+import shutil
+from datetime import datetime, timedelta
+
+import socrates
+
+
+THEMES = os.path.join(os.path.dirname(os.path.abspath(socrates.__file__)),
+                      'themes')
+
+WORDS = """
+lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor
+incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud
+exercitation ullamco laboris nisi aliquip ex ea commodo consequat duis aute
+irure in reprehenderit voluptate velit esse cillum fugiat nulla pariatur
+excepteur sint occaecat cupidatat non proident sunt culpa qui officia deserunt
+mollit anim id est laborum python django jinja template static site generator
+""".split()
+
+CATEGORIES = ['Python', 'Django', 'Jinja2', 'Web', 'Linux', 'Vim', 'Git',
+              'Photos', 'Travel', 'Books', 'Music', 'Open Source', 'Design',
+              'Typography', 'Databases', 'Testing', 'Performance', 'Security',
+              'Misc', 'Announcements']
+
+CODE = {
+    'python': 'def add(a, b):\n    """Add two numbers."""\n    return a + b\n',
+    'javascript': 'function add(a, b) {\n    return a + b;\n}\n',
+    'bash': 'for f in *.md; do\n    wc -w "$f"\ndone\n',
+}
+
+# Share of Markdown, reStructuredText and textile posts
+FORMATS = [('markdown', 0.7), ('rst', 0.2), ('textile', 0.1)]
+
+DELIMITER = '-' * 79
+
+
+def _sentence(rng, n=None):
+    words = [rng.choice(WORDS) for _ in range(n or rng.randint(6, 18))]
+    words[0] = words[0].capitalize()
+    if rng.random() < 0.2:
+        i = rng.randrange(len(words))
+        words[i] = '"%s"' % words[i]
+    if rng.random() < 0.1:
+        words.insert(rng.randrange(len(words)), 'HTML & CSS')
+    if rng.random() < 0.1:
+        words.insert(rng.randrange(len(words)), '--')
+    return ' '.join(words) + rng.choice(['.', '.', '.', '?', '...'])
+
+
+def _paragraph(rng):
+    return ' '.join(_sentence(rng) for _ in range(rng.randint(2, 6)))
+
+
+def _pick_format(rng):
+    x = rng.random()
+    for name, share in FORMATS:
+        if x < share:
+            return name
+        x -= share
+    return FORMATS[0][0]
+
+
+def _markdown(rng, title, date, categories):
+    out = [DELIMITER, 'title: "%s"' % title,
+           'date: %s' % date.strftime('%Y-%m-%d %H:%M:%S'), 'categories:']
+    out.extend('    - %s' % c for c in categories)
+    out.extend([DELIMITER, ''])
+    for i in range(rng.randint(3, 10)):
+        out.extend([_paragraph(rng), ''])
+        if rng.random() < 0.3:
+            lang = rng.choice(sorted(CODE))
+            out.extend(['```%s' % lang, CODE[lang].rstrip(), '```', ''])
+        if rng.random() < 0.2:
+            out.extend('* %s' % _sentence(rng, 5) for _ in range(3))
+            out.append('')
+    return '\n'.join(out)
+
+
+def _rst(rng, title, date, categories):
+    out = [':title: %s' % title,
+           ':date: %s' % date.strftime('%Y-%m-%d %H:%M'),
+           ':categories: %s' % ', '.join(categories), '']
+    for i in range(rng.randint(3, 10)):
+        out.extend([_paragraph(rng), ''])
+        if rng.random() < 0.3:
+            lang = rng.choice(sorted(CODE))
+            out.extend(['.. code-block:: %s' % lang, ''])
+            out.extend('    ' + line
+                       for line in CODE[lang].rstrip().split('\n'))
+            out.append('')
+    return '\n'.join(out)
+
+
+def _textile(rng, title, date, categories):
+    out = [DELIMITER, 'title: "%s"' % title,
+           'date: %s' % date.strftime('%Y-%m-%d %H:%M:%S'), 'categories:']
+    out.extend('    - %s' % c for c in categories)
+    out.extend([DELIMITER, ''])
+    for i in range(rng.randint(3, 10)):
+        out.extend(['p. ' + _paragraph(rng), ''])
+        if rng.random() < 0.2:
+            out.extend('# %s' % _sentence(rng, 5) for _ in range(3))
+            out.append('')
+    return '\n'.join(out)
+
+
+WRITERS = {
+    'markdown': ('md', _markdown),
+    'rst': ('rst', _rst),
+    'textile': ('textile', _textile),
+}
+
+
+def post_path(directory, n):
+    """
+    Return the path of the ``n``-th post of a generated site.
+    """
+    for name in os.listdir(os.path.join(directory, 'posts')):
+        if name.startswith('%06d-' % n):
+            return os.path.join(directory, 'posts', name)
+
+
+def make_site(directory, posts, theme='default', seed=0):
+    """
+    Create a blog with ``posts`` posts in ``directory``, replacing whatever
+    was there.
+    """
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    shutil.copytree(os.path.join(THEMES, theme), directory)
+
+    # Replace the example post
+    posts_dir = os.path.join(directory, 'posts')
+    shutil.rmtree(posts_dir)
+    os.mkdir(posts_dir)
+
+    with open(os.path.join(directory, 'config.yaml')) as f:
+        config = [line for line in f.read().splitlines()
+                  if not line.startswith('text_processor')]
+    config.append('text_processor: extension')
+    with open(os.path.join(directory, 'config.yaml'), 'w') as f:
+        f.write('\n'.join(config) + '\n')
+
+    rng = random.Random(seed)
+    start = datetime(2005, 1, 1, 9, 0)
+    step = timedelta(minutes=max(1, 60 * 24 * 365 * 10 // max(posts, 1)))
+    for n in range(posts):
+        date = start + step * n
+        title = 'Post %d: %s' % (n, _sentence(rng, 4).rstrip('.?'))
+        categories = rng.sample(CATEGORIES, rng.randint(1, 3))
+        extension, writer = WRITERS[_pick_format(rng)]
+        name = '%06d-%s.%s' % (n, date.strftime('%Y-%m-%d'), extension)
+        with open(os.path.join(posts_dir, name), 'w') as f:
+            f.write(writer(rng, title.replace('"', ''), date, categories))
+    return directory
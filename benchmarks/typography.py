@@ -0,0 +1,74 @@
+"""
+Measure the throughput of the typography filters on generated HTML.
+
+    $ python -m benchmarks.typography --size 5
+
+The corpus is made of paragraphs, lists and code blocks in the style of
+``benchmarks.sitegen`` posts, so it has plenty of quotes, dashes,
+ellipses, ampersands and capitals for the filters to work on.
+"""
+import time
+import random
+from optparse import OptionParser
+
+from socrates import smartypants, typography
+
+from .sitegen import CODE, _paragraph, _sentence
+
+
+def make_corpus(size, seed=0):
+    """
+    Return an HTML document of roughly ``size`` megabytes.
+    """
+    rng = random.Random(seed)
+    out = []
+    length = 0
+    while length < size * 1024 * 1024:
+        r = rng.random()
+        if r < 0.15:
+            block = '<pre><code>%s</code></pre>' % rng.choice(
+                list(CODE.values()))
+        elif r < 0.3:
+            block = '<ul>%s</ul>' % ''.join(
+                '<li>%s</li>' % _sentence(rng, 5) for _ in range(3))
+        elif r < 0.4:
+            block = '<h2>%s</h2>' % _sentence(rng, 4)
+        else:
+            block = '<p>%s <em>%s</em></p>' % (_paragraph(rng),
+                                               _sentence(rng, 3))
+        out.append(block)
+        length += len(block)
+    return '\n'.join(out)
+
+
+def measure(func, text, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        func(text)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = OptionParser(usage="Usage: python -m benchmarks.typography")
+    parser.add_option('-s', '--size', type='float', default=2,
+                      help="Corpus size in megabytes. [default: %default]")
+    parser.add_option('-r', '--repeat', type='int', default=3,
+                      help="Runs per filter, the fastest is kept.")
+    options, args = parser.parse_args()
+
+    text = make_corpus(options.size)
+    megabytes = len(text) / 1024.0 / 1024.0
+    filters = [('smartypants', smartypants.smartyPants),
+               ('typogrify', typography.typogrify)]
+    for name, func in filters:
+        elapsed = measure(func, text, options.repeat)
+        print('%-12s %8.2fs %8.2f MB/s' % (name, elapsed,
+                                           megabytes / elapsed))
+
+
+if __name__ == '__main__':
+    main()
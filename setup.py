@@ -22,7 +22,7 @@ setup(
     author_email='me@honza.ca',
     maintainer='Honza Pokorny',
     maintainer_email='me@honza.ca',
-    packages=['socrates'],
+    packages=['socrates', 'socrates.templatetags'],
     include_package_data=True,
     scripts=['bin/socrates'],
 )
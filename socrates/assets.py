@@ -0,0 +1,110 @@
+"""
+Fingerprinted media files. Every file in the deploy directory's ``media``
+gets a copy with a hash of its contents in the name, e.g.
+``media/style.3f9a1c07d2.css``, so that it can be cached forever. A manifest
+maps the original names to the fingerprinted ones and the ``asset``
+template filter looks them up.
+"""
+import os
+import json
+import hashlib
+
+from .compress import SUFFIXES
+from .utils import write_file
+
+
+MANIFEST_FILENAME = 'manifest.json'
+
+# Length of the hash in fingerprinted names
+DIGEST_LENGTH = 10
+
+# The manifest of the current build, set by ``use_manifest``
+_manifest = {}
+
+
+def use_manifest(manifest):
+    """
+    Make ``asset`` look up paths in ``manifest``. Worker processes forked
+    afterwards share the same manifest.
+    """
+    global _manifest
+    _manifest = manifest
+
+
+def asset(path):
+    """
+    Return the fingerprinted URL of ``path``, e.g. ``/media/style.css``.
+    Paths that aren't in the manifest are returned as they are.
+    """
+    name = path.lstrip('/')
+    if name not in _manifest:
+        return path
+    return path[:len(path) - len(name)] + _manifest[name]
+
+
+def fingerprinted_name(name, digest):
+    base, ext = os.path.splitext(name)
+    return '%s.%s%s' % (base, digest[:DIGEST_LENGTH], ext)
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def build_manifest(root, directory, previous, stamps):
+    """
+    Fingerprint every file in ``directory``, which is relative to the deploy
+    directory ``root``. ``previous`` is the manifest of the last build and
+    ``stamps`` maps files to the ``[mtime, size, digest]`` they had back
+    then; files whose modification time and size haven't changed aren't
+    hashed again. Fingerprinted copies that are no longer needed are
+    removed.
+
+    Return the new manifest and stamps.
+    """
+    copies = set(previous.values())
+    manifest = {}
+    new_stamps = {}
+
+    for dirpath, dirnames, filenames in os.walk(os.path.join(root,
+                                                             directory)):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            if filename.startswith('.') or filename == MANIFEST_FILENAME or \
+                    filename.endswith(SUFFIXES) or name in copies:
+                continue
+
+            st = os.stat(path)
+            stamp = [st.st_mtime_ns, st.st_size]
+            data = None
+            entry = stamps.get(name)
+            if entry is not None and entry[:2] == stamp:
+                digest = entry[2]
+            else:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                digest = hashlib.md5(data).hexdigest()
+            new_stamps[name] = stamp + [digest]
+
+            target = fingerprinted_name(name, digest)
+            target_path = os.path.join(root, target)
+            if data is not None or not os.path.exists(target_path):
+                if data is None:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                write_file(target_path, data)
+            manifest[name] = target
+
+    current = set(manifest.values())
+    for name in copies - current:
+        path = os.path.join(root, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    return manifest, new_stamps
@@ -0,0 +1,126 @@
+import os
+import shutil
+import pickle
+import hashlib
+import tempfile
+
+
+class ArtifactCache(object):
+    """
+    A persistent, content addressed store of pickled values. Every entry
+    lives in its own file so that worker processes can read and write the
+    cache concurrently without any locking.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @staticmethod
+    def key(*parts):
+        h = hashlib.sha1()
+        for part in parts:
+            if not isinstance(part, bytes):
+                part = str(part).encode('utf-8')
+            h.update(part)
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def get(self, key, default=None):
+        try:
+            with open(self.path(key), 'rb') as f:
+                return pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError,
+                AttributeError, ImportError):
+            return default
+
+    def set(self, key, value):
+        path = self.path(key)
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Another worker got there first
+                pass
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def prune(self, keep):
+        """
+        Remove all entries whose keys aren't in ``keep``.
+        """
+        if not os.path.exists(self.directory):
+            return
+        for prefix in os.listdir(self.directory):
+            d = os.path.join(self.directory, prefix)
+            if not os.path.isdir(d):
+                continue
+            for name in os.listdir(d):
+                if name.startswith('.tmp') or prefix + name not in keep:
+                    os.remove(os.path.join(d, name))
+
+    def clear(self):
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+
+
+class LRUCache(ArtifactCache):
+    """
+    An ``ArtifactCache`` that is kept under ``max_size`` bytes by evicting
+    the least recently used entries. Reading an entry bumps its mtime.
+    """
+
+    def __init__(self, directory, max_size):
+        super(LRUCache, self).__init__(directory)
+        self.max_size = max_size
+
+    def get(self, key, default=None):
+        value = super(LRUCache, self).get(key, default)
+        if value is not default:
+            try:
+                os.utime(self.path(key), None)
+            except OSError:
+                pass
+        return value
+
+    def trim(self):
+        """
+        Evict the oldest entries until the cache fits into ``max_size``.
+        """
+        if not os.path.exists(self.directory):
+            return
+        entries = []
+        total = 0
+        for prefix in os.listdir(self.directory):
+            d = os.path.join(self.directory, prefix)
+            if not os.path.isdir(d):
+                continue
+            for name in os.listdir(d):
+                path = os.path.join(d, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
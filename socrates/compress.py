@@ -0,0 +1,93 @@
+"""
+Precompressed copies of the deploy directory's text files, for web servers
+that serve ``foo.html.gz`` in place of ``foo.html`` (nginx's
+``gzip_static`` and ``brotli_static``).
+"""
+import os
+import gzip
+
+from .utils import write_file
+
+
+# Files that get compressed siblings
+EXTENSIONS = ('.html', '.xml', '.css', '.js', '.json')
+
+SUFFIXES = ('.gz', '.br')
+
+
+def _gzip(data):
+    return gzip.compress(data, 9, mtime=0)
+
+
+def get_encoders():
+    """
+    Return ``(suffix, function)`` pairs of the available encodings. Brotli
+    is only used when the ``brotli`` package is installed.
+    """
+    encoders = [('.gz', _gzip)]
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        encoders.append(('.br', brotli.compress))
+    return encoders
+
+
+def _is_current(path, sibling):
+    """
+    A sibling is up to date when it has the modification time of the file
+    it was made from, see ``compress_file``.
+    """
+    try:
+        return os.stat(sibling).st_mtime_ns == os.stat(path).st_mtime_ns
+    except OSError:
+        return False
+
+
+def needs_compression(path, encoders):
+    return not all(_is_current(path, path + suffix)
+                   for suffix, encode in encoders)
+
+
+def compress_file(path, encoders):
+    """
+    Write the stale compressed siblings of ``path`` and give them its
+    modification time. Returns the list of siblings written.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    st = os.stat(path)
+    written = []
+    for suffix, encode in encoders:
+        sibling = path + suffix
+        if _is_current(path, sibling):
+            continue
+        write_file(sibling, encode(data))
+        os.utime(sibling, ns=(st.st_atime_ns, st.st_mtime_ns))
+        written.append(sibling)
+    return written
+
+
+def find_stale(directory, encoders):
+    """
+    Return the files in ``directory`` whose compressed siblings are missing
+    or older than they are. Siblings of files that no longer exist are
+    removed.
+    """
+    stale = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        names = set(files)
+        for name in files:
+            if name.startswith('.'):
+                continue
+            path = os.path.join(root, name)
+            base, ext = os.path.splitext(name)
+            if ext in SUFFIXES:
+                if base not in names and base.endswith(EXTENSIONS):
+                    os.remove(path)
+                continue
+            if ext in EXTENSIONS and needs_compression(path, encoders):
+                stale.append(path)
+    return stale
@@ -0,0 +1,129 @@
+"""
+Build graph. For every output file we remember a signature of everything it
+was rendered from: the template and the templates it extends, includes or
+imports, the settings those templates refer to, and the posts and pages in
+its context. An output is only rendered again when its signature changes.
+"""
+import os
+import re
+import hashlib
+
+
+# Template tags that pull in other templates, both in Django and Jinja2
+TEMPLATE_REFERENCE = re.compile(
+    r"""{%-?\s*(?:extends|include|import|from)\s+["']([^"']+)["']""")
+TEMPLATE_TAG = re.compile(r'{{.*?}}|{%.*?%}', re.S)
+IDENTIFIER = re.compile(r'[A-Za-z_]\w*')
+
+# Values that change on every run and shouldn't force a rebuild on their own
+VOLATILE = ('now',)
+
+
+class BuildGraph(object):
+
+    def __init__(self, layout, previous=None, settings=None, helpers=None):
+        self.layout = layout
+        self.previous = previous or {}
+        self.current = {}
+        self._templates = {}
+        self._digests = {}
+        # Settings that change every output file, whether its template
+        # refers to them or not
+        self.settings = self.digest(settings or {})
+        # Data behind template filters, tracked like the settings a template
+        # refers to
+        self.helpers = helpers or {}
+
+    def _read_template(self, name):
+        try:
+            with open(os.path.join(self.layout, name), 'rb') as f:
+                return f.read().decode('utf-8')
+        except (IOError, OSError):
+            return ''
+
+    def template(self, name, _seen=None):
+        """
+        Return a ``(digest, identifiers)`` pair for a template and all the
+        templates it depends on. ``identifiers`` are all names used inside
+        template tags and tell us which settings the template can see.
+        """
+        if name in self._templates:
+            return self._templates[name]
+
+        seen = _seen or set()
+        seen.add(name)
+
+        source = self._read_template(name)
+        h = hashlib.md5(source.encode('utf-8'))
+        identifiers = set()
+        for tag in TEMPLATE_TAG.findall(source):
+            identifiers.update(IDENTIFIER.findall(tag))
+
+        for ref in TEMPLATE_REFERENCE.findall(source):
+            if ref in seen:
+                continue
+            digest, names = self.template(ref, seen)
+            h.update(digest.encode('utf-8'))
+            identifiers.update(names)
+
+        result = (h.hexdigest(), frozenset(identifiers))
+        if _seen is None:
+            self._templates[name] = result
+        return result
+
+    def digest(self, value):
+        """
+        Hash a template value. Posts and pages are represented by their
+        fingerprint, containers are hashed recursively.
+        """
+        key = id(value)
+        if key in self._digests:
+            return self._digests[key][1]
+
+        fingerprinted = hasattr(value, 'fingerprint')
+        if fingerprinted:
+            d = value.fingerprint()
+        elif isinstance(value, dict):
+            h = hashlib.md5()
+            for k in sorted(value, key=str):
+                h.update(str(k).encode('utf-8'))
+                h.update(self.digest(value[k]).encode('utf-8'))
+            d = h.hexdigest()
+        elif isinstance(value, (list, tuple)):
+            h = hashlib.md5()
+            for item in value:
+                h.update(self.digest(item).encode('utf-8'))
+            d = h.hexdigest()
+        else:
+            d = hashlib.md5(repr(value).encode('utf-8')).hexdigest()
+
+        if fingerprinted or isinstance(value, (dict, list)):
+            # Keep a reference so the id can't be reused during this build
+            self._digests[key] = (value, d)
+        return d
+
+    def signature(self, template, site, values):
+        digest, identifiers = self.template(template)
+        h = hashlib.md5(digest.encode('utf-8'))
+        h.update(self.settings.encode('utf-8'))
+        for name in sorted(identifiers):
+            if name in site and name not in values and name not in VOLATILE:
+                h.update(name.encode('utf-8'))
+                h.update(self.digest(site[name]).encode('utf-8'))
+            if name in self.helpers:
+                h.update(name.encode('utf-8'))
+                h.update(self.digest(self.helpers[name]).encode('utf-8'))
+        for name in sorted(values):
+            if name not in VOLATILE:
+                h.update(name.encode('utf-8'))
+                h.update(self.digest(values[name]).encode('utf-8'))
+        return h.hexdigest()
+
+    def is_stale(self, path, template, site, values):
+        """
+        Record the signature of ``path`` and tell whether it has to be
+        rendered again.
+        """
+        sig = self.signature(template, site, values)
+        self.current[path] = sig
+        return self.previous.get(path) != sig or not os.path.exists(path)
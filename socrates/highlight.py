@@ -0,0 +1,86 @@
+"""
+Syntax highlighting shared by the Markdown and reStructuredText processors.
+Looking up a lexer by name and setting up a formatter are surprisingly
+expensive in Pygments, so both are cached per process. The highlighted
+HTML itself can be kept in a persistent cache, see ``use_cache``.
+"""
+from functools import lru_cache
+
+from .profiling import profiled
+
+
+# Persistent cache of highlighted code blocks, set by ``use_cache``
+_cache = None
+
+
+def use_cache(cache):
+    """
+    Store highlighted code in ``cache`` (an ``ArtifactCache``) and reuse
+    it. Worker processes forked afterwards share the same cache.
+    """
+    global _cache
+    _cache = cache
+
+
+def _freeze(value):
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+@lru_cache(maxsize=128)
+def _get_lexer(language):
+    from pygments.lexers import get_lexer_by_name, TextLexer
+    try:
+        return get_lexer_by_name(language)
+    except ValueError:
+        # no lexer found - use the text one instead of an exception
+        return TextLexer()
+
+
+def _language(language):
+    return (language or 'text').strip().lower()
+
+
+def get_lexer(language):
+    return _get_lexer(_language(language))
+
+
+@lru_cache(maxsize=16)
+def _get_formatter(options):
+    from pygments.formatters import HtmlFormatter
+    return HtmlFormatter(**dict(options))
+
+
+def get_formatter(**options):
+    """
+    Return a shared ``HtmlFormatter`` for these options.
+    """
+    return _get_formatter(_freeze(options))
+
+
+@profiled('pygments')
+def highlight(code, language, options=None):
+    """
+    Highlight ``code`` as HTML, ``options`` are passed on to the
+    ``HtmlFormatter``. Pygments isn't touched at all for cached blocks.
+    """
+    options = options or {}
+    if _cache is None:
+        return _highlight(code, language, options)
+
+    import pygments
+    key = _cache.key(pygments.__version__, _language(language),
+                     _freeze(options), code)
+    html = _cache.get(key)
+    if html is None:
+        html = _highlight(code, language, options)
+        _cache.set(key, html)
+    return html
+
+
+def _highlight(code, language, options):
+    from pygments import highlight as pygmentize
+    return pygmentize(code, get_lexer(language), get_formatter(**options))
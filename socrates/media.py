@@ -0,0 +1,119 @@
+"""
+Incremental copying of the theme's media directory into the deploy
+directory.
+"""
+import os
+import shutil
+import errno
+
+
+# From <linux/fs.h>, clone a file's extents into another file
+FICLONE = 0x40049409
+
+LINK_MODES = ['copy', 'hardlink', 'reflink']
+
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, 'rb') as s:
+        with open(dst, 'wb') as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    shutil.copystat(src, dst)
+
+
+def _hardlink(src, dst):
+    os.link(src, dst)
+
+
+def _copy(src, dst):
+    shutil.copy2(src, dst)
+
+
+def _is_current(src, dst):
+    """
+    A file is up to date when its size and modification time match the
+    source, or when it's the very same file (a hardlink).
+    """
+    try:
+        d = os.stat(dst)
+    except OSError:
+        return False
+    s = os.stat(src)
+    if (s.st_dev, s.st_ino) == (d.st_dev, d.st_ino):
+        return True
+    return s.st_size == d.st_size and s.st_mtime_ns == d.st_mtime_ns
+
+
+def sync_tree(src, dst, link='copy', keep=(), siblings=()):
+    """
+    Make ``dst`` a copy of ``src``, only copying new or changed files and
+    removing the ones that no longer exist in ``src``. Modification times are
+    preserved. ``link`` can be ``hardlink`` or ``reflink`` to share the data
+    with the source when both are on the same filesystem; we fall back to
+    copying when that's not possible. Paths in ``keep`` (relative to ``dst``)
+    are generated files and are never removed, neither are files named like
+    a kept or copied file plus one of the suffixes in ``siblings``.
+
+    Return the list of paths in ``dst`` that have been written.
+    """
+    if link not in LINK_MODES:
+        raise ValueError("Unknown link mode '%s'." % link)
+
+    written = []
+    methods = {'copy': _copy, 'hardlink': _hardlink, 'reflink': _reflink}
+    transfer = methods[link]
+
+    if not os.path.exists(dst):
+        os.makedirs(dst)
+
+    for root, dirs, files in os.walk(src):
+        rel = os.path.relpath(root, src)
+        target = os.path.normpath(os.path.join(dst, rel))
+
+        if os.path.isfile(target) or os.path.islink(target):
+            os.remove(target)
+        if not os.path.exists(target):
+            os.mkdir(target)
+
+        # Remove files and directories that are gone from the source
+        wanted = set(dirs) | set(files)
+        for name in os.listdir(target):
+            path = os.path.join(target, name)
+            if name in wanted:
+                continue
+            if os.path.normpath(os.path.join(rel, name)) in keep:
+                continue
+            base, suffix = os.path.splitext(name)
+            if suffix in siblings and (base in wanted or os.path.normpath(
+                    os.path.join(rel, base)) in keep):
+                continue
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+        for name in files:
+            s = os.path.join(root, name)
+            d = os.path.join(target, name)
+            if os.path.isdir(d) and not os.path.islink(d):
+                shutil.rmtree(d)
+            if _is_current(s, d):
+                continue
+            if os.path.lexists(d):
+                os.remove(d)
+            try:
+                transfer(s, d)
+            except (OSError, IOError) as e:
+                if transfer is _copy or e.errno not in (
+                        errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP,
+                        errno.ENOTTY, errno.EINVAL, errno.ENOSYS,
+                        errno.EMLINK):
+                    raise
+                # Different filesystem or no support, copy instead
+                if os.path.lexists(d):
+                    os.remove(d)
+                transfer = _copy
+                _copy(s, d)
+            written.append(d)
+
+    return written
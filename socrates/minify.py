@@ -0,0 +1,136 @@
+"""
+Whitespace and comment removal for generated HTML and XML files.
+"""
+import re
+
+from .profiling import profiled
+
+
+# Elements whose contents are left exactly as they are, and comments.
+# Pygments output is always wrapped in a ``<pre>``, so highlighted code is
+# kept intact too.
+PROTECTED = re.compile(
+    r'<(pre|textarea|script|style)\b.*?</\1\s*>|<!--.*?-->', re.S | re.I)
+
+# Generated HTML is mostly indentation. Patterns start with a literal so
+# that the regex engine can skip ahead quickly, and they're deliberately
+# case sensitive for the same reason.
+NEWLINE = re.compile(r'\n\s*')
+SPACES = re.compile(r'  +')
+
+# Whitespace next to these tags never shows up on the page
+BLOCK_TAGS = (
+    r'(?:html|head|body|title|meta|link|base|div|p|ul|ol|li|dl|dt|dd|'
+    r'table|thead|tbody|tfoot|tr|th|td|caption|colgroup|col|form|fieldset|'
+    r'legend|h[1-6]|hr|br|blockquote|section|article|aside|header|footer|'
+    r'nav|main|figure|figcaption|address|option|noscript|!DOCTYPE|'
+    r'!doctype)\b')
+SPACE_BEFORE_BLOCK = re.compile(r' <(?=/?%s)' % BLOCK_TAGS)
+SPACE_AFTER_BLOCK = re.compile(r'(</?%s[^>]*>) ' % BLOCK_TAGS)
+
+# Protected elements that are blocks too, the others are inline or not
+# shown at all, and whitespace next to them is kept
+PROTECTED_BLOCK = re.compile(r'</?(?:pre|style)\b', re.I)
+
+# The text of Atom entries is often HTML that's put in as it is, e.g.
+# ``<content type="html">``, and is left alone like CDATA sections
+XML_TOKEN = re.compile(
+    r'<!\[CDATA\[.*?\]\]>|'
+    r'<(content|summary)\b[^>]*(?<!/)>.*?</\1\s*>(?:\s+(?=<))?|'
+    r'<!--.*?-->\s*|>\s+(?=<)', re.S)
+
+
+def _is_comment(token):
+    # Conditional comments are for old versions of Internet Explorer
+    return token.startswith('<!--') and not token.startswith('<!--[if')
+
+
+def _collapse(text):
+    text = NEWLINE.sub(' ', text)
+    text = SPACES.sub(' ', text)
+    text = SPACE_BEFORE_BLOCK.sub('<', text)
+    return SPACE_AFTER_BLOCK.sub(r'\1', text)
+
+
+def minify_html(text):
+    """
+    Collapse runs of whitespace into a single space, drop it altogether
+    next to block level tags and at the start and end of the document, and
+    remove comments. Whitespace inside of tags is collapsed as well.
+
+    >>> minify_html('<p>Text\\n  <script>f()</script>\\n more</p>')
+    '<p>Text <script>f()</script> more</p>'
+    >>> minify_html('<p>Some <textarea>a\\n b</textarea> text</p>')
+    '<p>Some <textarea>a\\n b</textarea> text</p>'
+    >>> minify_html('<p>A <!--[if IE]>B<![endif]--> C</p>')
+    '<p>A <!--[if IE]>B<![endif]--> C</p>'
+    >>> minify_html('<div>\\n  <pre> x </pre>\\n</div>')
+    '<div><pre> x </pre></div>'
+    """
+    out = []
+    pending = []
+    pos = 0
+    for m in PROTECTED.finditer(text):
+        pending.append(text[pos:m.start()])
+        pos = m.end()
+        token = m.group()
+        if _is_comment(token):
+            # Collapse the text around it as a whole
+            continue
+        chunk = _collapse(''.join(pending))
+        if PROTECTED_BLOCK.match(token):
+            chunk = chunk.rstrip(' ')
+        out.append(chunk)
+        out.append(token)
+        pending = []
+    pending.append(text[pos:])
+    out.append(_collapse(''.join(pending)))
+
+    # Whitespace after a ``</pre>`` or ``</style>`` doesn't show either
+    for i in range(2, len(out), 2):
+        if PROTECTED_BLOCK.match(out[i - 1]):
+            out[i] = out[i].lstrip(' ')
+    return ''.join(out).strip()
+
+
+def _minify_xml_token(m):
+    token = m.group()
+    if m.group(1):
+        return token.rstrip()
+    if token.startswith('<![CDATA['):
+        return token
+    if token.startswith('<!--'):
+        return ''
+    return '>'
+
+
+def minify_xml(text):
+    """
+    Remove comments and the whitespace between tags. Text, CDATA sections
+    and the contents of ``<content>`` and ``<summary>`` are left alone.
+
+    >>> minify_xml('<entry>\\n  <content type="html"><em>A</em> <b>B</b>'
+    ...            '</content>\\n</entry>')
+    '<entry><content type="html"><em>A</em> <b>B</b></content></entry>'
+    """
+    return XML_TOKEN.sub(_minify_xml_token, text).strip()
+
+
+MINIFIERS = {
+    '.html': minify_html,
+    '.htm': minify_html,
+    '.xml': minify_xml,
+}
+
+
+@profiled('minify')
+def minify(path, contents):
+    """
+    Minify ``contents`` according to the extension of ``path``. Other
+    files are returned unchanged.
+    """
+    ext = path[path.rfind('.'):].lower() if '.' in path else ''
+    func = MINIFIERS.get(ext)
+    if func is None:
+        return contents
+    return func(contents)
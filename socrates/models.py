@@ -1,11 +1,13 @@
 import os
+import io
+import json
 import hashlib
 from datetime import datetime
-import yaml
-from .processors import RstProcessor, MarkdownProcessor, TextileProcessor
-from .utils import slugify, ligatures
+from . import __version__
+from .processors import get_processor
+from .utils import slugify, ligatures, load_yaml, truncate_html_words
 from .exceptions import ConfigurationError
-from .typography import typogrify
+from .cache import ArtifactCache
 
 EXTENSIONS = {
     '.md': 'markdown',
@@ -18,16 +20,54 @@ EXTENSIONS = {
     '.textile': 'textile'
 }
 
+# Settings that change the outcome of parsing a file. Cached artifacts are
+# only reused when all of them are the same.
+ARTIFACT_SETTINGS = ['text_processor', 'initial_header_level', 'pygments',
+                     'punctuation', 'ligatures', 'date_format']
+
+# Settings that the attributes of a post or page are derived from
+MODEL_SETTINGS = ['date_format', 'append_slash', 'url_include_day', 'author',
+                  'excerpt_words']
+
+
+DELIMITER = b'-' * 79
+
 
 class File(object):
 
-    def __init__(self, path, context):
+    # Attributes that aren't the result of parsing and so never get cached
+    TRANSIENT = ('context', 'path', 'filename', 'source_hash', 'artifact_key',
+                 'cache', '_contents', '_excerpt', 'related')
+
+    # The HTML body, see ``contents``
+    _contents = None
+
+    def __init__(self, path, context, cache=None):
 
         self.context = context  # site wide config
         self.path = path
+        self.cache = cache
 
         self.filename = os.path.basename(path)
-        self.parse()
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.source_hash = hashlib.md5(data).hexdigest()
+        self.artifact_key = self._get_artifact_key()
+
+        artifacts = None
+        if cache is not None:
+            artifacts = cache.get(self.artifact_key)
+
+        if artifacts is not None:
+            # Unchanged since the last build, skip parsing altogether
+            self.__dict__.update(artifacts)
+        else:
+            self._build(data)
+            if cache is not None:
+                cache.set(self.artifact_key, self._get_artifacts())
+
+    def _build(self, data):
+        self.scan(data)
 
         # The file should have at least a title
         try:
@@ -35,14 +75,110 @@ class File(object):
         except KeyError:
             raise ConfigurationError
 
+    @property
+    def contents(self):
+        """
+        The HTML body. Only the front matter is parsed up front, the body is
+        rendered the first time it's needed.
+        """
+        if self._contents is None:
+            self._contents = self.load_contents()
+        return self._contents
+
+    @contents.setter
+    def contents(self, value):
+        self._contents = value
+
+    @property
+    def contents_key(self):
+        return ArtifactCache.key(self.artifact_key, 'contents')
+
+    def has_contents(self):
+        """
+        Whether the body is available without running a text processor.
+        """
+        return self._contents is not None or (
+            self.cache is not None and self.contents_key in self.cache)
+
+    def needs_contents(self, names):
+        """
+        Whether a template using ``names`` needs the body to be rendered.
+        """
+        return 'contents' in names and not self.has_contents()
+
+    def load_contents(self):
+        """
+        Return the HTML body, from the cache or by parsing the whole file.
+        """
+        if self.cache is not None:
+            contents = self.cache.get(self.contents_key)
+            if contents is not None:
+                return contents
+
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        contents = self.render_contents(data)
+        # Don't cache the body of a file that has changed during the build
+        if self.cache is not None and \
+                hashlib.md5(data).hexdigest() == self.source_hash:
+            self.cache.set(self.contents_key, contents)
+        return contents
+
+    def render_contents(self, data):
+        if self._is_rst():
+            contents = self._parse_rst(data).content
+        else:
+            contents = self._parse(data)
+
         if self.context['punctuation']:
-            self.contents = typogrify(self.contents)
+            from .typography import typogrify
+            contents = typogrify(contents)
 
         if self.context['ligatures']:
-            self.contents = ligatures(self.contents)
+            contents = ligatures(contents)
+        return contents
+
+    def _get_artifact_key(self):
+        """
+        Identify the parsed form of this file by its source and the settings
+        that affect parsing.
+        """
+        settings = dict((k, self.context.get(k)) for k in ARTIFACT_SETTINGS)
+        return ArtifactCache.key(__version__, self.__class__.__name__,
+                                 self.source_hash,
+                                 json.dumps(settings, sort_keys=True,
+                                            default=str))
+
+    def fingerprint(self):
+        """
+        Identify everything templates can see of this file.
+        """
+        settings = dict((k, self.context.get(k)) for k in MODEL_SETTINGS)
+        return ArtifactCache.key(self.artifact_key,
+                                 json.dumps(settings, sort_keys=True,
+                                            default=str))
+
+    def _get_artifacts(self):
+        return dict((k, v) for k, v in self.__dict__.items()
+                    if k not in self.TRANSIENT)
+
+    def __getstate__(self):
+        # The site wide config is shared by all files, don't pickle a copy of
+        # it for every single one.
+        state = self.__dict__.copy()
+        state['context'] = None
+        # Nor the other posts this one refers to
+        state.pop('related', None)
+        return state
+
+    def _is_rst(self):
+        if self.context['text_processor'] == 'extension':
+            return self._get_type() == 'rst'
+        self.file_type = self.context['text_processor']
+        return False
 
     def hash_file(self):
-        return hashlib.md5(open(self.path).read()).hexdigest()
+        return self.source_hash
 
     def _get_type(self):
         name, extension = os.path.splitext(self.path)
@@ -52,59 +188,84 @@ class File(object):
         except KeyError:
             raise Exception('Unknown extension')
 
-    def parse(self):
+    def scan(self, data):
         """
-        Decide what file type the current file is.
+        Decide what file type the current file is and parse its front matter.
         """
-        is_rst = False
-        if self.context['text_processor'] == 'extension':
-            file_type = self._get_type()
-            is_rst = file_type == 'rst'
-
-        if self.context['text_processor'] in ['markdown', 'textile', 'html']:
-            is_rst = False
-            self.file_type = self.context['text_processor']
-
-        if is_rst:
-            self._parse_rst()
+        if self._is_rst():
+            self._scan_rst(data)
         else:
-            self._parse()
+            self._scan(data)
 
-    def _parse(self):
+    def _scan(self, data):
         """
-        Read file contents. Extract yaml config. Return post contents and
-        parsed config.
+        Extract the yaml config, without reading any further.
         """
-        f = open(self.path, 'r')
+        start = False
+        conf = b""
+        for x in io.BytesIO(data):
+            if x.startswith(DELIMITER):
+                if start:
+                    break
+                start = True
+                continue
+
+            if start:
+                conf += x
+
+        self.config = load_yaml(conf)
 
-        c = ""
+    def _parse(self, data):
+        """
+        Split the file into yaml config and contents. Return the rendered
+        contents.
+        """
+        c = b""
         start = False
         end = False
-        conf = ""
-        for x in f:
-            if x.startswith('-' * 79):
+        for x in io.BytesIO(data):
+            if x.startswith(DELIMITER):
                 if not start:
                     start = True
                 else:
                     end = True
                 continue
 
-            if start and not end:
-                conf += x
-            else:
+            if not start or end:
                 c += x
-        f.close()
 
-        self.config = yaml.load(conf)
-        self.contents = self._process_contents(c)
+        return self._process_contents(c)
 
-    def _parse_rst(self):
+    def _parse_rst(self, data, metadata_only=False):
+        from .processors import RstProcessor
         try:
             h = self.context['initial_header_level']
         except KeyError:
             h = 2
-        p = RstProcessor(self.path, self.context, 'html', h)
-        self.contents = p.content
+        source = data.decode('utf-8')
+        if metadata_only:
+            source = self._rst_docinfo(source)
+        return RstProcessor(self.path, self.context, 'html', h, source)
+
+    def _rst_docinfo(self, source):
+        """
+        Return the field list a reStructuredText document starts with, that
+        is all docutils needs to find its metadata.
+        """
+        lines = source.splitlines(True)
+        for i, line in enumerate(lines):
+            if line.strip() and not line.startswith(':') and \
+                    not line[0].isspace():
+                break
+        else:
+            return source
+        return ''.join(lines[:i])
+
+    def _scan_rst(self, data):
+        p = self._parse_rst(data, metadata_only=True)
+        if not p.metadata:
+            # Not a plain field list at the top, parse the whole thing
+            p = self._parse_rst(data)
         self.config = p.metadata
 
         try:
@@ -139,12 +300,8 @@ class File(object):
         p = self.file_type
         p = p.lower()
 
-        if p == 'markdown':
-            processor = MarkdownProcessor()
-            html = processor.render(text)
-        elif p == 'textile':
-            processor = TextileProcessor()
-            html = processor.render(text)
+        if p in ('markdown', 'textile'):
+            html = get_processor(p).render(text)
         elif p == 'html':
             html = text
         else:
@@ -165,12 +322,14 @@ class Post(File):
         - url (e.g. /2010/02/cool-post/)
         - categories (list)
         - author (from config.yaml or from front config)
+        - excerpt (the first ``excerpt_words`` words of the contents)
+        - related (the most similar posts, see ``related_posts``)
 
-    All attributes are calculated on init.
+    All attributes except for the contents are calculated on init.
     """
 
-    def __init__(self, path, context):
-        super(Post, self).__init__(path, context)
+    def __init__(self, path, context, cache=None):
+        super(Post, self).__init__(path, context, cache)
 
         self.year = str(self.config['date'].year)
         self.month = self.config['date'].strftime("%m")
@@ -212,7 +371,57 @@ class Post(File):
         else:
             self.author = self.config['author']
 
-        self.reading_time = self._get_reading_time()
+    # The truncated contents, see ``excerpt``
+    _excerpt = None
+
+    # Set by the generator when ``related_posts`` is on
+    related = ()
+
+    @property
+    def reading_time(self):
+        return self._get_reading_time()
+
+    @property
+    def excerpt(self):
+        """
+        The contents truncated to ``excerpt_words`` words, for listing pages.
+        Computed once and kept in the cache with the contents.
+        """
+        if self._excerpt is None:
+            self._excerpt = self.load_excerpt()
+        return self._excerpt
+
+    @property
+    def excerpt_key(self):
+        return ArtifactCache.key(self.contents_key, 'excerpt',
+                                 self.context['excerpt_words'])
+
+    def load_excerpt(self):
+        if self.cache is not None:
+            excerpt = self.cache.get(self.excerpt_key)
+            if excerpt is not None:
+                return excerpt
+
+        excerpt = truncate_html_words(self.contents,
+                                      int(self.context['excerpt_words']))
+        if self.cache is not None:
+            self.cache.set(self.excerpt_key, excerpt)
+        return excerpt
+
+    def fingerprint(self):
+        fingerprint = super(Post, self).fingerprint()
+        if not self.related:
+            return fingerprint
+        # Titles and urls of related posts are part of their artifacts
+        return ArtifactCache.key(fingerprint,
+                                 *[p.artifact_key for p in self.related])
+
+    def needs_contents(self, names):
+        if super(Post, self).needs_contents(names):
+            return True
+        return 'excerpt' in names and self._excerpt is None and \
+            not self.has_contents() and \
+            (self.cache is None or self.excerpt_key not in self.cache)
 
     def _get_atom_date(self, date):
         d = date.strftime('%Y-%m-%dT%H:%M:%S%z')
@@ -232,8 +441,8 @@ class Post(File):
 
 class Page(File):
 
-    def __init__(self, path, context):
-        super(Page, self).__init__(path, context)
+    def __init__(self, path, context, cache=None):
+        super(Page, self).__init__(path, context, cache)
         if self.config.get('slug'):
             self.slug = self.config['slug']
         else:
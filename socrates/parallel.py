@@ -0,0 +1,135 @@
+"""
+Helpers for spreading work over a pool of worker processes.
+"""
+import os
+
+from . import profiling
+from .exceptions import ConfigurationError
+
+
+# Site settings and artifact cache of the current worker, set by
+# ``init_worker``.
+_settings = None
+_cache = None
+
+
+def get_jobs(value):
+    """
+    Normalise the ``jobs`` setting. ``0`` means one worker per CPU.
+    """
+    try:
+        jobs = int(value)
+    except (TypeError, ValueError):
+        raise ConfigurationError
+    if jobs == 0:
+        import multiprocessing
+        jobs = multiprocessing.cpu_count()
+    return max(jobs, 1)
+
+
+def get_context():
+    """
+    Prefer forking workers, they inherit the parent's state for free.
+    """
+    import multiprocessing
+    try:
+        return multiprocessing.get_context('fork')
+    except (AttributeError, ValueError):
+        return multiprocessing
+
+
+def can_fork():
+    if not hasattr(os, 'fork'):
+        return False
+    import multiprocessing
+    try:
+        multiprocessing.get_context('fork')
+    except (AttributeError, ValueError):
+        return False
+    return True
+
+
+def init_worker(settings, cache=None):
+    global _settings, _cache
+    _settings = settings
+    _cache = cache
+
+
+def init_pool(initializer=None, initargs=()):
+    profiling.reset()
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def load_file(args):
+    """
+    Create a ``Post`` or ``Page`` instance in a worker. Exceptions are turned
+    into a status so that the parent can report them just like the serial
+    code path does. Profiling data is sent back along with the result.
+    """
+    cls, path = args
+    with profiling.timer('parse file') as t:
+        try:
+            result = 'ok', cls(path, _settings, _cache)
+        except ConfigurationError:
+            result = 'config', None
+        except Exception:
+            result = 'error', None
+    profiling.record_file(path, t.elapsed)
+    return result + (profiling.snapshot(),)
+
+
+def load_contents(obj):
+    """
+    Render the body of a ``Post`` or ``Page`` in a worker. Returns the same
+    kind of status as ``load_file``.
+    """
+    obj.context = _settings
+    with profiling.timer('parse contents') as t:
+        try:
+            result = 'ok', obj.load_contents()
+        except ConfigurationError:
+            result = 'config', None
+        except Exception:
+            result = 'error', None
+    profiling.record_file(obj.path, t.elapsed)
+    return result + (profiling.snapshot(),)
+
+
+def map_jobs(func, items, jobs, initializer=None, initargs=()):
+    """
+    Apply ``func`` to every item and return the results in order. Runs in the
+    current process when there's only one job or nothing worth spreading.
+    """
+    items = list(items)
+    if jobs < 2 or len(items) < 2:
+        if initializer is not None:
+            initializer(*initargs)
+        return [func(item) for item in items]
+
+    jobs = min(jobs, len(items))
+    chunksize = max(1, len(items) // (jobs * 4))
+    pool = get_context().Pool(jobs, init_pool, (initializer, initargs))
+    try:
+        return pool.map(func, items, chunksize)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def map_threads(func, items, jobs):
+    """
+    Like ``map_jobs`` but with a pool of threads, for work that releases the
+    GIL such as compression.
+    """
+    items = list(items)
+    if jobs < 2 or len(items) < 2:
+        return [func(item) for item in items]
+
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(min(jobs, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,153 @@
+"""
+Build profiling. Stages of the generator and the text processors are timed
+with ``profiled``; nothing is recorded unless profiling has been enabled for
+the current process with ``enable``.
+"""
+import json
+import time
+import functools
+
+try:
+    process_time = time.process_time
+except AttributeError:
+    process_time = time.clock
+
+
+# The profiler of the current process, None when profiling is off
+_profiler = None
+
+
+class Profiler(object):
+
+    def __init__(self):
+        # name -> [calls, wall time, cpu time]
+        self.stages = {}
+        # source file -> wall time
+        self.files = {}
+
+    def record(self, name, wall, cpu):
+        stage = self.stages.setdefault(name, [0, 0.0, 0.0])
+        stage[0] += 1
+        stage[1] += wall
+        stage[2] += cpu
+
+    def record_file(self, path, wall):
+        self.files[path] = self.files.get(path, 0.0) + wall
+
+    def snapshot(self):
+        """
+        Return everything recorded so far and start over. Workers send this
+        back to the parent process, which ``merge``s it.
+        """
+        data = {'stages': self.stages, 'files': self.files}
+        self.stages = {}
+        self.files = {}
+        return data
+
+    def merge(self, data):
+        if not data:
+            return
+        for name, (calls, wall, cpu) in data['stages'].items():
+            stage = self.stages.setdefault(name, [0, 0.0, 0.0])
+            stage[0] += calls
+            stage[1] += wall
+            stage[2] += cpu
+        for path, wall in data['files'].items():
+            self.record_file(path, wall)
+
+    def slowest(self, n):
+        files = sorted(self.files.items(), key=lambda i: i[1], reverse=True)
+        return files[:n]
+
+    def report(self, n=10):
+        lines = ['%-32s %8s %10s %10s' % ('Stage', 'Calls', 'Wall (s)',
+                                          'CPU (s)')]
+        for name in sorted(self.stages):
+            calls, wall, cpu = self.stages[name]
+            lines.append('%-32s %8d %10.3f %10.3f' % (name, calls, wall, cpu))
+        if self.files:
+            lines.append('')
+            lines.append('Slowest files:')
+            for path, wall in self.slowest(n):
+                lines.append('%10.3f  %s' % (wall, path))
+        return '\n'.join(lines)
+
+    def save(self, path, n=10):
+        data = {
+            'stages': dict((name, {'calls': calls, 'wall': wall, 'cpu': cpu})
+                           for name, (calls, wall, cpu)
+                           in self.stages.items()),
+            'slowest_files': [{'path': p, 'wall': wall}
+                              for p, wall in self.slowest(n)],
+        }
+        with open(path, 'w') as f:
+            f.write(json.dumps(data, indent=4, sort_keys=True))
+
+
+def enable():
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+
+def reset():
+    """
+    Start a fresh profiler in a worker, so that the data it inherited from
+    the parent isn't counted twice.
+    """
+    if _profiler is not None:
+        enable()
+
+
+def get_profiler():
+    return _profiler
+
+
+def snapshot():
+    if _profiler is not None:
+        return _profiler.snapshot()
+
+
+def merge(data):
+    if _profiler is not None:
+        _profiler.merge(data)
+
+
+def record_file(path, wall):
+    if _profiler is not None:
+        _profiler.record_file(path, wall)
+
+
+class timer(object):
+    """
+    Context manager timing a block of code as the stage ``name``.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.cpu = process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.time() - self.wall
+        if _profiler is not None:
+            _profiler.record(self.name, self.elapsed,
+                             process_time() - self.cpu)
+
+
+def profiled(name):
+    """
+    Decorator timing every call of a function as the stage ``name``.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return func(*args, **kwargs)
+            with timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,198 @@
+"""
+Related posts. Every post is turned into a TF-IDF vector of its words, as
+weighted by ``search.post_terms``, and compared with all the other posts by
+cosine similarity. Needs NumPy and SciPy.
+"""
+import math
+
+import numpy
+from scipy import sparse
+
+
+# Bumped when the way posts are compared changes
+VERSION = 2
+
+# Rows of the similarity matrix computed at once
+BATCH_SIZE = 256
+
+
+class RelatedPosts(object):
+    """
+    Finds the ``count`` most similar posts of every post. The vectors and
+    neighbours of the previous build are kept in ``state`` (see
+    ``get_state``). When posts have been edited without adding or removing
+    any words, the IDF weights are the same and only those posts have to
+    be compared with all the others again. Otherwise everything is
+    computed again, the results never depend on earlier builds.
+    """
+
+    def __init__(self, count, state=None):
+        self.count = count
+        # Neighbours kept per post, a few more than needed so that most
+        # posts still have enough when some of them change
+        self.candidates = 2 * count
+        if not state or state.get('version') != VERSION or \
+                state.get('count') != count:
+            state = {}
+        self.paths = state.get('paths', [])
+        self.keys = state.get('keys', {})
+        self.vocabulary = state.get('vocabulary', {})
+        self.idf = state.get('idf')
+        self.matrix = state.get('matrix')
+        # path -> [(score, path), ...], best first
+        self.neighbors = state.get('neighbors', {})
+
+    def get_state(self):
+        return {'version': VERSION, 'count': self.count, 'paths': self.paths,
+                'keys': self.keys, 'vocabulary': self.vocabulary,
+                'idf': self.idf, 'matrix': self.matrix,
+                'neighbors': self.neighbors}
+
+    def update(self, paths, keys, get_terms):
+        """
+        Compute the related posts of all ``paths``. ``keys`` maps them to
+        something that changes with their words, e.g. ``search.terms_key``,
+        and ``get_terms(path)`` returns the ``{word: weight}`` of a post.
+
+        Return a dict of paths to the paths of their related posts.
+        """
+        changed = [p for p in paths if self.keys.get(p) != keys[p]]
+        if self.matrix is None or set(self.paths) != set(paths):
+            self._fit(paths, get_terms)
+        elif changed:
+            terms = dict((p, get_terms(p)) for p in changed)
+            if self._same_words(terms):
+                self._update(paths, changed, terms)
+            else:
+                self._fit(paths, get_terms)
+        self.keys = dict((p, keys[p]) for p in paths)
+
+        return dict((p, [path for score, path in
+                         self.neighbors.get(p, [])[:self.count]])
+                    for p in paths)
+
+    def _vectorize(self, terms):
+        """
+        Return the normalised TF-IDF vectors of a list of ``{word: weight}``
+        dicts as rows of a sparse matrix.
+        """
+        rows = []
+        cols = []
+        values = []
+        for i, words in enumerate(terms):
+            for word, weight in words.items():
+                col = self.vocabulary.get(word)
+                if col is not None:
+                    rows.append(i)
+                    cols.append(col)
+                    values.append(1 + math.log(weight))
+        matrix = sparse.csr_matrix(
+            (numpy.array(values, dtype=numpy.float32), (rows, cols)),
+            shape=(len(terms), len(self.vocabulary)))
+        matrix = sparse.csr_matrix(matrix.multiply(self.idf))
+        norms = numpy.sqrt(numpy.asarray(
+            matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix,
+                                 dtype=numpy.float32)
+
+    def _fit(self, paths, get_terms):
+        terms = [get_terms(p) for p in paths]
+        df = {}
+        for words in terms:
+            for word in words:
+                df[word] = df.get(word, 0) + 1
+        self.vocabulary = dict((w, i) for i, w in enumerate(sorted(df)))
+        n = len(paths)
+        self.idf = numpy.array(
+            [math.log((1.0 + n) / (1 + df[w])) + 1 for w in sorted(df)],
+            dtype=numpy.float32)
+
+        self.paths = list(paths)
+        self.matrix = self._vectorize(terms)
+        self.neighbors = {}
+        self._compare(range(len(paths)))
+
+    def _same_words(self, terms):
+        """
+        Whether the posts in ``terms`` still have the words of their rows in
+        the matrix, so that the document frequencies haven't changed.
+        """
+        index = dict((p, i) for i, p in enumerate(self.paths))
+        for path, words in terms.items():
+            if any(w not in self.vocabulary for w in words):
+                return False
+            row = self.matrix[index[path]]
+            if set(row.indices) != set(self.vocabulary[w] for w in words):
+                return False
+        return True
+
+    def _update(self, paths, changed, terms):
+        index = dict((p, i) for i, p in enumerate(self.paths))
+        changed_set = set(changed)
+        # Stack the rows we keep and the new ones, then put them in order
+        kept_rows = [index[p] for p in paths if p not in changed_set]
+        stacked = sparse.vstack(
+            [self.matrix[kept_rows],
+             self._vectorize([terms[p] for p in changed])], format='csr')
+        position = dict((p, i) for i, p in enumerate(
+            [p for p in paths if p not in changed_set] + changed))
+        self.matrix = stacked[[position[p] for p in paths]]
+        self.paths = list(paths)
+
+        rows = [i for i, p in enumerate(paths) if p in changed_set]
+        kept = []
+        for i, p in enumerate(paths):
+            if p in changed_set:
+                continue
+            neighbors = self.neighbors.get(p, [])
+            # Neighbours that have changed are compared again below
+            left = [n for n in neighbors if n[1] not in changed_set]
+            if len(left) < len(neighbors) and \
+                    len(neighbors) >= self.candidates:
+                # The next best post may be one we don't know about
+                rows.append(i)
+            else:
+                self.neighbors[p] = left
+                kept.append(i)
+
+        # Posts we kept only have to be compared with the changed ones
+        columns = [i for i, p in enumerate(paths) if p in changed_set]
+        if kept and columns:
+            scores = (self.matrix[kept] @ self.matrix[columns].T).tocsr()
+            for row, i in enumerate(kept):
+                start, end = scores.indptr[row], scores.indptr[row + 1]
+                found = [(float(s), paths[columns[c]]) for c, s in zip(
+                    scores.indices[start:end], scores.data[start:end])
+                    if s > 0]
+                if found:
+                    p = paths[i]
+                    self.neighbors[p] = self._best(self.neighbors[p] + found)
+        self._compare(rows)
+
+    def _best(self, neighbors):
+        neighbors.sort(key=lambda n: (-n[0], n[1]))
+        return neighbors[:self.candidates]
+
+    def _compare(self, rows):
+        """
+        Find the neighbours of the posts in ``rows`` among all posts.
+        """
+        rows = list(rows)
+        transposed = self.matrix.T.tocsc()
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            scores = (self.matrix[batch] @ transposed).toarray()
+            # A post isn't related to itself
+            scores[numpy.arange(len(batch)), batch] = 0
+            k = min(self.candidates, scores.shape[1])
+            if k == 0:
+                continue
+            if k < scores.shape[1]:
+                top = numpy.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = numpy.tile(numpy.arange(k), (len(batch), 1))
+            for row, i in enumerate(batch):
+                self.neighbors[self.paths[i]] = self._best(
+                    [(float(scores[row, j]), self.paths[j])
+                     for j in top[row] if scores[row, j] > 0])
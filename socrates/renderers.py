@@ -1,37 +1,194 @@
 import os
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+class Context(Mapping):
+    """
+    A read-only stack of dicts. Keys are looked up in the first layer that
+    has them, so the values of a single page can be put on top of the site
+    settings without copying either.
+    """
+
+    def __init__(self, *layers):
+        self.layers = ()
+        for layer in layers:
+            if isinstance(layer, Context):
+                self.layers += layer.layers
+            else:
+                self.layers += (layer,)
+
+    def push(self, layer):
+        """
+        Return a new context with ``layer`` on top of this one.
+        """
+        return Context(layer, self)
+
+    def __getitem__(self, key):
+        for layer in self.layers:
+            if key in layer:
+                return layer[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        for layer in self.layers:
+            if key in layer:
+                return True
+        return False
+
+    def __iter__(self):
+        seen = set()
+        for layer in self.layers:
+            for key in layer:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def __len__(self):
+        return len(set().union(*self.layers))
+
+    def copy(self):
+        """
+        Return a flat dict of all keys, like ``dict.copy``.
+        """
+        return dict(self)
+
 
 class BaseRenderer(object):
 
-    def render(self, template, values):
+    def render(self, template, context):
         raise NotImplementedError
 
+    def reset(self):
+        """
+        Forget compiled templates kept in memory.
+        """
+        pass
+
 
 class DjangoRenderer(BaseRenderer):
 
+    # Compiled templates are kept in memory by the cached loader
+    LOADERS = (
+        ('django.template.loaders.cached.Loader', (
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        )),
+    )
+
+    BUILTINS = (
+        'socrates.templatetags.typography',
+        'socrates.templatetags.assets',
+    )
+
     def __init__(self, path):
+        import django
         from django.conf import settings
-        from django.template.loader import render_to_string
+        from django.template import Context
+        from django.template.loader import get_template
+        try:
+            # Django 1.8 has no ``builtins`` option
+            from django.template.base import add_to_builtins
+        except ImportError:
+            add_to_builtins = None
 
         path = os.path.abspath(path)
-        settings.configure(DEBUG=True, TEMPLATE_DEBUG=True,
-                           TEMPLATE_DIRS=[path])
-        self._render = render_to_string
+        options = {'debug': True, 'loaders': self.LOADERS}
+        if add_to_builtins is None:
+            options['builtins'] = list(self.BUILTINS)
+        settings.configure(DEBUG=True, TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'DIRS': [path],
+            'OPTIONS': options,
+        }])
+        django.setup()
+        if add_to_builtins is not None:
+            for name in self.BUILTINS:
+                add_to_builtins(name)
+        self._context = Context
+        self._get_template = get_template
+
+    def reset(self):
+        from django.template import engines
+        for loader in engines['django'].engine.template_loaders:
+            if hasattr(loader, 'reset'):
+                loader.reset()
 
-    def render(self, template, values):
-        return self._render(template, values)
+    def render(self, template, context):
+        # Django's context is a stack of dicts too. Only the layers on top
+        # of the site settings are copied when they're pushed.
+        layers = getattr(context, 'layers', (context,))
+        c = self._context(layers[-1])
+        for layer in reversed(layers[:-1]):
+            c.push(layer)
+        return self._get_template(template).template.render(c)
 
 
 class Jinja2Renderer(BaseRenderer):
 
-    def __init__(self, path):
+    def __init__(self, path, cache_dir=None):
         from jinja2 import Environment, FileSystemLoader
-        self.env = Environment(loader=FileSystemLoader(path))
+        from .typography import FILTERS
+        from .assets import asset
+
+        # Compiled templates are stored in ``cache_dir`` and reused as long
+        # as the template source is the same
+        bytecode_cache = None
+        if cache_dir is not None:
+            from jinja2 import FileSystemBytecodeCache
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+        self.env = Environment(loader=FileSystemLoader(path),
+                               bytecode_cache=bytecode_cache)
         self.env.filters['in_category'] = self.is_in_category
+        self.env.filters['asset'] = self.context_filter(asset)
+        for name, func in FILTERS.items():
+            self.env.filters[name] = self.safe(func)
 
-    def render(self, template, values):
+    def reset(self):
+        if self.env.cache is not None:
+            self.env.cache.clear()
+
+    def render(self, template, context):
         t = self.env.get_template(template)
-        return t.render(values)
+        # A shared context uses our mapping as is, instead of merging it
+        # with the globals into a new dict
+        c = t.new_context(Context(context, t.globals), shared=True)
+        try:
+            return ''.join(t.root_render_func(c))
+        except Exception:
+            # Report the line in the template, not in the compiled code
+            self.env.handle_exception()
+
+    @staticmethod
+    def context_filter(func):
+        """
+        Jinja2 calls filters on constants, e.g. ``"style.css"|asset``, when
+        it compiles a template. Filters that take the context are always
+        called at render time.
+        """
+        try:
+            from jinja2 import pass_context
+        except ImportError:
+            from jinja2 import contextfilter as pass_context
+
+        @pass_context
+        def wrapper(context, value):
+            return func(value)
+        return wrapper
+
+    @staticmethod
+    def safe(func):
+        from markupsafe import Markup
+
+        def wrapper(text):
+            return Markup(func(text))
+        return wrapper
 
     @classmethod
     def is_in_category(cls, post, category):
@@ -0,0 +1,161 @@
+"""
+reStructuredText support. Kept apart from the other processors because
+docutils is expensive to import and only needed for rst sites.
+"""
+import docutils
+
+import docutils.core
+from docutils.writers.html4css1 import HTMLTranslator
+from docutils.writers.latex2e import LaTeXTranslator
+from docutils import nodes
+from docutils.parsers.rst import directives, Directive
+
+from .profiling import profiled
+from .highlight import highlight
+
+# Set to True if you want inline CSS styles instead of classes
+INLINESTYLES = False
+
+# The default formatter options
+DEFAULT = dict(noclasses=INLINESTYLES)
+
+# Add name -> formatter options pairs for every variant you want to use
+VARIANTS = {
+    # 'linenos': dict(noclasses=INLINESTYLES, linenos=True),
+}
+
+
+def raw_html(name, args, options, content, lineno, contentOffset, blockText,
+             state, stateMachine):
+    """
+    Simply render the input html as html.
+    """
+    if content == "":
+        return
+    return [nodes.raw(text='\n'.join(content), format='html')]
+
+
+raw_html.content = True
+directives.register_directive('raw_html', raw_html)
+
+
+class Pygments(Directive):
+    required_arguments = 1
+    optional_arguments = 0
+    final_argument_whitespace = True
+    option_spec = dict([(key, directives.flag) for key in VARIANTS])
+    has_content = True
+    formatter_options = DEFAULT
+
+    def run(self):
+        self.assert_has_content()
+        # take an arbitrary option if more than one is given
+        if self.options and VARIANTS[list(self.options.keys())[0]]:
+            self.formatter_options = VARIANTS[list(self.options.keys())[0]]
+
+        parsed = highlight('\n'.join(self.content), self.arguments[0],
+                           self.formatter_options)
+        return [nodes.raw('', parsed, format='html')]
+
+
+class RstProcessor(object):
+
+    allowed_types = ['html', 'latex', 'xetex']
+
+    class HtmlTranslator(HTMLTranslator):
+        def astext(self):
+            return ''.join(self.body)
+
+        def visit_field_body(self, node):
+            pass
+
+        def depart_field_body(self, node):
+            pass
+
+    class LatexTranslator(LaTeXTranslator):
+        def astext(self):
+            return ''.join(self.body)
+
+        def visit_field_body(self, node):
+            pass
+
+        def depart_field_body(self, node):
+            pass
+
+    @profiled('rst')
+    def __init__(self, filename, global_settings, output='html',
+                 header_level=2, source=None):
+
+        self.settings = global_settings
+        self.pygments_builder()
+
+        directives.register_directive('sourcecode', self.pygmenter)
+        directives.register_directive('code-block', self.pygmenter)
+
+        self.filename = filename
+        self.source = source
+        if output not in self.allowed_types:
+            raise NotImplementedError("Can't render '%s'." % output)
+        self.header_level = str(header_level)
+        self.output = output
+        self.metadata = None
+        self.get_publisher()
+        self.get_metadata()
+        self.run()
+
+    def pygments_builder(self):
+
+        self.pygmenter = Pygments
+        if self.settings['pygments']:
+            self.pygmenter.formatter_options = self.settings['pygments']
+
+    def render_node_to_html(self, document, node):
+        if self.output == 'html':
+            visitor = self.HtmlTranslator(document)
+        elif self.output == 'latex' or self.output == 'xetex':
+            visitor = self.LatexTranslator(document)
+        else:
+            pass
+
+        node.walkabout(visitor)
+        return visitor.astext()
+
+    def get_metadata(self):
+        self.metadata = {}
+        for docinfo in self.pub.document.traverse(docutils.nodes.docinfo):
+            for element in docinfo.children:
+                if element.tagname == 'field':
+                    name_elem, body_elem = element.children
+                    name = name_elem.astext()
+                    value = self.render_node_to_html(self.pub.document,
+                                                     body_elem)
+                else:
+                    name = element.tagname
+                    value = element.astext()
+                self.metadata[name] = value
+
+    def get_publisher(self):
+        extra_params = {
+            'initial_header_level': self.header_level
+        }
+        pub = docutils.core.Publisher(
+            destination_class=docutils.io.StringOutput)
+        pub.set_components('standalone', 'restructuredtext', self.output)
+        pub.process_programmatic_settings(None, extra_params, None)
+        if self.source is not None:
+            pub.source_class = docutils.io.StringInput
+        pub.set_source(source=self.source, source_path=self.filename)
+        pub.publish()
+        self.pub = pub
+
+    def run(self):
+        parts = self.pub.writer.parts
+        if self.output == 'html':
+            content = parts.get('body')
+        elif self.output == 'latex' or self.output == 'xetex':
+            content = parts.get('body')
+            content = parts.get('whole')
+        else:
+            pass
+
+        self.content = content
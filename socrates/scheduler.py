@@ -0,0 +1,115 @@
+"""
+Render scheduler. Every output file of a build is queued as a ``RenderJob``
+and the whole queue is drained at once, either in the current process or by
+a pool of forked workers. Forked workers inherit the generator, including its
+already warmed template renderer, so jobs are never pickled; only their
+index in the queue is sent over.
+"""
+from . import profiling
+from .parallel import can_fork, get_context
+
+
+# The generator and jobs being rendered, inherited by forked workers.
+_active = None
+
+
+class RenderJob(object):
+    """
+    A single output file: render ``template`` with the ``site`` settings and
+    ``values``, optionally pass the result through ``postprocess`` and write
+    it to ``path``.
+    """
+
+    def __init__(self, path, template, site, values, postprocess=None,
+                 name=None):
+        self.path = path
+        self.template = template
+        self.site = site
+        self.values = values
+        self.postprocess = postprocess
+        self.name = name
+
+
+def _run_job(index):
+    generator, jobs = _active
+    job = jobs[index]
+    return generator.render_job(job), profiling.snapshot()
+
+
+class RenderQueue(object):
+
+    def __init__(self, generator):
+        self.generator = generator
+        self.jobs = []
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def files(self):
+        """
+        Return the posts and pages whose bodies have to be rendered for the
+        queued jobs, each once. Templates only need the bodies of the files
+        they render if they refer to them, e.g. ``post.contents``.
+        """
+        seen = set()
+        files = []
+        for job in self.jobs:
+            digest, names = self.generator.graph.template(job.template)
+            for value in job.values.values():
+                if not isinstance(value, (list, tuple)):
+                    value = [value]
+                for item in value:
+                    if hasattr(item, 'needs_contents') and \
+                            id(item) not in seen and \
+                            item.needs_contents(names):
+                        seen.add(id(item))
+                        files.append(item)
+        return files
+
+    def add(self, path, template, values, postprocess=None, name=None):
+        """
+        Queue an output file, unless nothing it depends on has changed since
+        the last build. Jobs are rendered with the site settings as they are
+        at the time they're queued.
+        """
+        generator = self.generator
+        site = generator.SETTINGS
+        if generator.graph.is_stale(path, template, site, values):
+            self.jobs.append(
+                RenderJob(path, template, site, values, postprocess, name))
+
+    @profiling.profiled('render queue')
+    def run(self):
+        """
+        Render and write all queued jobs. Jobs with a ``name`` are logged as
+        they finish, in the order they were queued. Files whose contents
+        have changed are added to the generator's ``written`` list.
+        """
+        global _active
+
+        jobs, self.jobs = self.jobs, []
+        workers = min(self.generator.jobs, len(jobs))
+
+        if workers < 2 or not can_fork():
+            for job in jobs:
+                self._done(job, self.generator.render_job(job))
+            return
+
+        _active = (self.generator, jobs)
+        chunksize = max(1, len(jobs) // (workers * 8))
+        pool = get_context().Pool(workers, profiling.reset)
+        try:
+            results = pool.imap(_run_job, range(len(jobs)), chunksize)
+            for job, (changed, stats) in zip(jobs, results):
+                profiling.merge(stats)
+                self._done(job, changed)
+        finally:
+            pool.close()
+            pool.join()
+            _active = None
+
+    def _done(self, job, changed):
+        if changed:
+            self.generator.written.append(job.path)
+        if job.name:
+            self.generator.log(job.name)
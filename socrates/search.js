@@ -0,0 +1,123 @@
+/*
+ * Client for the search index Socrates writes to deploy/search.
+ *
+ *     <script src="/search/search.js"></script>
+ *     <script>
+ *       var search = new SocratesSearch('/search/');
+ *       search.query('static site', 10).then(function (results) {
+ *         // [{url: ..., title: ..., date: ..., score: ...}, ...]
+ *       });
+ *     </script>
+ *
+ * Posts that contain all the words are returned, best matches first, up to
+ * an optional limit. Only the shards holding the words of a query and the
+ * titles and URLs of the posts returned are downloaded.
+ */
+(function (root) {
+  'use strict';
+
+  var WORD = /[\p{L}\p{N}]+/gu;
+
+  // Same as socrates.search.fnv1a
+  function fnv1a(word) {
+    var bytes = new TextEncoder().encode(word);
+    var h = 0x811c9dc5;
+    for (var i = 0; i < bytes.length; i++) {
+      h ^= bytes[i];
+      h = Math.imul(h, 0x01000193) >>> 0;
+    }
+    return h;
+  }
+
+  function getJSON(url) {
+    return fetch(url).then(function (response) {
+      if (!response.ok) {
+        throw new Error(url + ': ' + response.status);
+      }
+      return response.json();
+    });
+  }
+
+  function SocratesSearch(base) {
+    this.base = base || '/search/';
+    this.shards = {};
+    this.docs = {};
+    this.meta = null;
+  }
+
+  SocratesSearch.prototype.load = function () {
+    if (this.meta === null) {
+      this.meta = getJSON(this.base + 'meta.json');
+    }
+    return this.meta;
+  };
+
+  SocratesSearch.prototype.tokenize = function (text, stopwords) {
+    var words = text.toLowerCase().match(WORD) || [];
+    return words.filter(function (w, i) {
+      return w.length > 1 && stopwords.indexOf(w) === -1 &&
+        words.indexOf(w) === i;
+    });
+  };
+
+  SocratesSearch.prototype.shard = function (n) {
+    if (!(n in this.shards)) {
+      this.shards[n] = getJSON(this.base + n + '.json');
+    }
+    return this.shards[n];
+  };
+
+  SocratesSearch.prototype.doc = function (meta, id) {
+    var n = Math.floor(id / meta.docsPerFile);
+    if (!(n in this.docs)) {
+      this.docs[n] = getJSON(this.base + 'docs/' + n + '.json');
+    }
+    return this.docs[n].then(function (docs) {
+      var d = docs[id % meta.docsPerFile];
+      return {url: d[0], title: d[1], date: d[2]};
+    });
+  };
+
+  SocratesSearch.prototype.query = function (text, limit) {
+    var self = this;
+    return this.load().then(function (meta) {
+      var words = self.tokenize(text, meta.stopwords);
+      return Promise.all(words.map(function (word) {
+        return self.shard(fnv1a(word) % meta.shards).then(function (shard) {
+          return shard[word] || [];
+        });
+      })).then(function (lists) {
+        if (!lists.length) {
+          return [];
+        }
+        var total = meta.count;
+        var scores = {};
+        var counts = {};
+        lists.forEach(function (postings) {
+          // Rare words count for more
+          var idf = Math.log(1 + total / (postings.length || 1));
+          postings.forEach(function (p) {
+            scores[p[0]] = (scores[p[0]] || 0) + p[1] * idf;
+            counts[p[0]] = (counts[p[0]] || 0) + 1;
+          });
+        });
+        var found = Object.keys(scores).filter(function (doc) {
+          return counts[doc] === lists.length;
+        }).sort(function (a, b) {
+          return scores[b] - scores[a];
+        });
+        if (limit) {
+          found = found.slice(0, limit);
+        }
+        return Promise.all(found.map(function (doc) {
+          return self.doc(meta, +doc).then(function (d) {
+            d.score = scores[doc];
+            return d;
+          });
+        }));
+      });
+    });
+  };
+
+  root.SocratesSearch = SocratesSearch;
+})(this);
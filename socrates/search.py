@@ -0,0 +1,317 @@
+"""
+Static search index. The words of every post are put into an inverted index
+that's split into shards by a hash of the word, so that a search only has to
+download the shards of the words it looks for. ``search.js`` does the
+searching in the browser.
+
+    deploy/search/meta.json       -- shard count, stop words, post count
+    deploy/search/0.json ...      -- word -> [[post, score], ...]
+    deploy/search/docs/0.json ... -- [[url, title, date], ...] of the posts
+                                     numbered from 0 to DOCS_PER_FILE - 1,
+                                     and so on
+"""
+import os
+import re
+import json
+from html import unescape
+
+from .cache import ArtifactCache
+from .utils import write_file
+
+
+# Bumped when tokenizing or the file format changes
+VERSION = 2
+
+# Shards are sized to hold this many bytes of postings, roughly
+SHARD_SIZE = 32 * 1024
+
+# Posts per file of titles and URLs, only the files of the posts that were
+# found are downloaded
+DOCS_PER_FILE = 128
+
+# How much a word counts depending on where it's found
+WEIGHTS = {'title': 5, 'categories': 3, 'body': 1}
+
+STOP_WORDS = frozenset("""
+a an and are as at be but by for from has have in is it its of on or that
+the this to was were will with
+""".split())
+
+TAG = re.compile(r'<[^>]*>')
+WORD = re.compile(r'[^\W_]+')
+
+META_FILENAME = 'meta.json'
+DOCS_DIRNAME = 'docs'
+CLIENT_FILENAME = 'search.js'
+
+
+def tokenize(text):
+    """
+    Return the words of ``text``, lowercased. HTML tags are ignored.
+    """
+    text = unescape(TAG.sub(' ', text))
+    return [w for w in WORD.findall(text.lower())
+            if w not in STOP_WORDS and len(w) > 1]
+
+
+def fnv1a(word):
+    """
+    32-bit FNV-1a hash of the UTF-8 encoded ``word``, ``search.js`` uses
+    the same one to find shards.
+    """
+    h = 0x811c9dc5
+    for byte in bytearray(word.encode('utf-8')):
+        h = ((h ^ byte) * 0x01000193) & 0xffffffff
+    return h
+
+
+def post_terms(post, cache=None):
+    """
+    Return a ``{word: score}`` dict for ``post``. Kept in ``cache`` along
+    with the post's contents, see ``terms_key``.
+    """
+    key = terms_key(post)
+    if cache is not None:
+        terms = cache.get(key)
+        if terms is not None:
+            return terms
+
+    fields = {
+        'title': post.title,
+        'categories': ' '.join(c['name'] for c in post.categories),
+        'body': post.contents,
+    }
+    terms = {}
+    for field, text in fields.items():
+        weight = WEIGHTS[field]
+        for word in tokenize(text):
+            terms[word] = terms.get(word, 0) + weight
+    if cache is not None:
+        cache.set(key, terms)
+    return terms
+
+
+def terms_key(post):
+    return ArtifactCache.key(post.contents_key, 'search', VERSION)
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':'), sort_keys=True,
+                      ensure_ascii=False)
+
+
+def _sorted(postings):
+    # Best matches first
+    return [[doc, -score] for score, doc in sorted(postings)]
+
+
+def _shard_count(size):
+    count = 1
+    while count * SHARD_SIZE < size:
+        count *= 2
+    return count
+
+
+def _size(word, plist):
+    return len(word) + 8 * len(plist)
+
+
+def _remove_numbered(directory, count):
+    """
+    Remove the ``<n>.json`` files in ``directory`` numbered ``count`` and
+    up.
+    """
+    for name in os.listdir(directory):
+        number = name[:-len('.json')]
+        if name.endswith('.json') and number.isdigit() and \
+                int(number) >= count:
+            os.remove(os.path.join(directory, name))
+
+
+class SearchIndex(object):
+    """
+    Writes the index of a list of posts to ``directory``. Posts keep their
+    number from one build to the next, and when only a few posts have
+    changed only the shards holding their words are updated. ``state`` is
+    what ``get_state`` returned after the previous build.
+    """
+
+    def __init__(self, directory, state=None):
+        state = state or {}
+        self.directory = directory
+        if state.get('version') != VERSION:
+            state = {}
+        # path -> number and key of the cached words of every post
+        self.ids = state.get('ids', {})
+        self.keys = state.get('keys', {})
+        self.shards = state.get('shards', 0)
+        # Rough size of all the postings, decides the number of shards
+        self.size = state.get('size', 0)
+
+    def get_state(self):
+        return {'version': VERSION, 'ids': self.ids, 'keys': self.keys,
+                'shards': self.shards, 'size': self.size}
+
+    def assign_ids(self, posts):
+        """
+        Number new posts and forget the removed ones. Numbers are reused
+        only once more than half of them are unused. Returns ``False`` if
+        posts have been renumbered.
+        """
+        paths = set(p.path for p in posts)
+        ids = dict((k, v) for k, v in self.ids.items() if k in paths)
+        renumbered = False
+        if ids and len(ids) * 2 < max(ids.values()) + 1:
+            ids = {}
+            renumbered = True
+        next_id = max(ids.values()) + 1 if ids else 0
+        for post in sorted(posts, key=lambda p: p.path):
+            if post.path not in ids:
+                ids[post.path] = next_id
+                next_id += 1
+        self.ids = ids
+        return not renumbered
+
+    def build(self, posts, cache=None):
+        """
+        Write the index and return the list of files written.
+        """
+        previous = dict(self.ids)
+        kept = self.assign_ids(posts)
+        keys = dict((p.path, terms_key(p)) for p in posts)
+
+        shards = None
+        if kept and self.keys and os.path.exists(
+                os.path.join(self.directory, META_FILENAME)):
+            shards = self._update(posts, keys, previous, cache)
+        if shards is None:
+            shards = self._rebuild(posts, cache)
+        self.keys = keys
+
+        docs_directory = os.path.join(self.directory, DOCS_DIRNAME)
+        if not os.path.exists(docs_directory):
+            os.makedirs(docs_directory)
+        files = dict(('%d.json' % n, _dumps(shard))
+                     for n, shard in shards.items())
+        files[META_FILENAME] = _dumps(self._meta(posts))
+        buckets = self._docs(posts)
+        for n, docs in enumerate(buckets):
+            files[os.path.join(DOCS_DIRNAME, '%d.json' % n)] = _dumps(docs)
+        written = []
+        for name, contents in files.items():
+            path = os.path.join(self.directory, name)
+            if write_file(path, contents.encode('utf-8')):
+                written.append(path)
+
+        # Files left over from when there were more of them
+        _remove_numbered(self.directory, self.shards)
+        _remove_numbered(docs_directory, len(buckets))
+
+        client = os.path.join(self.directory, CLIENT_FILENAME)
+        source = os.path.join(os.path.dirname(__file__), CLIENT_FILENAME)
+        with open(source, 'rb') as f:
+            if write_file(client, f.read()):
+                written.append(client)
+        return written
+
+    def _meta(self, posts):
+        return {
+            'version': VERSION,
+            'shards': self.shards,
+            'stopwords': sorted(STOP_WORDS),
+            'count': len(posts),
+            'docsPerFile': DOCS_PER_FILE,
+        }
+
+    def _docs(self, posts):
+        """
+        Return the ``[url, title, date]`` of the posts, split into lists of
+        ``DOCS_PER_FILE`` by their number. Unused numbers are ``None``.
+        """
+        size = max(self.ids.values()) + 1 if self.ids else 0
+        docs = [None] * size
+        for post in posts:
+            docs[self.ids[post.path]] = ['/' + post.url, post.title,
+                                         post.date]
+        return [docs[i:i + DOCS_PER_FILE]
+                for i in range(0, size, DOCS_PER_FILE)]
+
+    def _rebuild(self, posts, cache):
+        """
+        Return all the shards, as a ``{number: {word: postings}}`` dict.
+        """
+        postings = {}
+        for post in posts:
+            doc = self.ids[post.path]
+            for word, score in post_terms(post, cache).items():
+                postings.setdefault(word, []).append((-score, doc))
+
+        self.size = 0
+        for word in postings:
+            postings[word] = _sorted(postings[word])
+            self.size += _size(word, postings[word])
+        self.shards = _shard_count(self.size)
+
+        shards = dict((n, {}) for n in range(self.shards))
+        for word, plist in postings.items():
+            shards[fnv1a(word) % self.shards][word] = plist
+        return shards
+
+    def _update(self, posts, keys, previous, cache):
+        """
+        Return the shards that hold words of new, changed or removed posts,
+        updated. Returns ``None`` when the whole index has to be rebuilt.
+        """
+        # word -> {post: new score, or None to remove the post}
+        updates = {}
+        for path in self.keys:
+            if path in keys:
+                continue
+            terms = cache.get(self.keys[path]) if cache is not None else None
+            if terms is None or path not in previous:
+                return None
+            for word in terms:
+                updates.setdefault(word, {})[previous[path]] = None
+
+        for post in posts:
+            if self.keys.get(post.path) == keys[post.path]:
+                continue
+            old = {}
+            if post.path in self.keys:
+                if cache is not None:
+                    old = cache.get(self.keys[post.path])
+                if old is None or cache is None:
+                    return None
+            new = post_terms(post, cache)
+            doc = self.ids[post.path]
+            for word in set(old) | set(new):
+                if old.get(word) != new.get(word):
+                    updates.setdefault(word, {})[doc] = new.get(word)
+
+        shards = {}
+        size = self.size
+        for word, docs in updates.items():
+            n = fnv1a(word) % self.shards
+            if n not in shards:
+                path = os.path.join(self.directory, '%d.json' % n)
+                try:
+                    with open(path, 'rb') as f:
+                        shards[n] = json.loads(f.read().decode('utf-8'))
+                except (IOError, OSError, ValueError):
+                    return None
+            shard = shards[n]
+            old = shard.get(word, [])
+            plist = [(-score, doc) for doc, score in old if doc not in docs]
+            plist.extend((-score, doc) for doc, score in docs.items()
+                         if score is not None)
+            plist = _sorted(plist)
+            size += _size(word, plist) - (_size(word, old) if old else 0)
+            if plist:
+                shard[word] = plist
+            else:
+                shard.pop(word, None)
+
+        if _shard_count(size) != self.shards:
+            return None
+        self.size = size
+        return shards
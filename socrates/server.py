@@ -0,0 +1,346 @@
+"""
+Development server for the deploy directory. Requests are handled in
+threads, responses carry ETag and Last-Modified headers and support
+conditional and Range requests, text is gzipped, and pages reload
+themselves after every rebuild when the site is being watched.
+"""
+import io
+import os
+import re
+import gzip
+import threading
+import functools
+import email.utils
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from .assets import DIGEST_LENGTH
+from .parallel import can_fork, get_context
+
+
+# Pages listen for rebuilds on this path
+RELOAD_URL = '/__reload'
+
+RELOAD_SCRIPT = (b'<script>new EventSource("' + RELOAD_URL.encode('ascii') +
+                 b'").onmessage = function() { location.reload(); };'
+                 b'</script>')
+
+# Seconds between keep-alive comments on an idle event stream
+KEEPALIVE = 15
+
+# Media files with a hash in their name never change, see ``assets``
+FINGERPRINTED = re.compile(r'\.[0-9a-f]{%d}\.\w+$' % DIGEST_LENGTH)
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json',
+                'application/xml', 'application/atom+xml', 'image/svg+xml')
+
+
+class Reloader(object):
+    """
+    Tells the pages that are open in a browser that the site has been
+    rebuilt. Pass ``notify`` as the callback of ``watch.watch``. Works
+    across processes, see ``serve_in_background``.
+    """
+
+    def __init__(self):
+        context = get_context()
+        self._version = context.Value('i', 0, lock=False)
+        self.condition = context.Condition()
+
+    @property
+    def version(self):
+        return self._version.value
+
+    def notify(self, *args):
+        with self.condition:
+            self._version.value += 1
+            self.condition.notify_all()
+
+    def wait(self, version, timeout=None):
+        """
+        Wait for a rebuild after ``version`` and return the current version.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+class Server(ThreadingHTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, handler, reloader=None):
+        self.reloader = reloader
+        # path -> (stamp, body) of compressed and rewritten files
+        self.bodies = {}
+        self.lock = threading.Lock()
+        ThreadingHTTPServer.__init__(self, address, handler)
+
+    def body(self, path, stamp, inject, compress):
+        """
+        Return the contents of ``path``, with the live reload script added
+        and gzipped as requested. Kept until the file changes.
+        """
+        key = (path, inject, compress)
+        with self.lock:
+            cached = self.bodies.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        if inject:
+            i = data.rfind(b'</body>')
+            if i == -1:
+                data += RELOAD_SCRIPT
+            else:
+                data = data[:i] + RELOAD_SCRIPT + data[i:]
+        if compress:
+            data = gzip.compress(data, 6, mtime=0)
+        with self.lock:
+            self.bodies[key] = (stamp, data)
+        return data
+
+
+class Handler(SimpleHTTPRequestHandler):
+    """
+    Serves ``/foo/`` from ``/foo/index.html`` and ``/foo`` from
+    ``/foo.html``, the way generated sites are laid out.
+    """
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] == RELOAD_URL:
+            return self.send_events()
+        self.fix_path()
+        return SimpleHTTPRequestHandler.do_GET(self)
+
+    def do_HEAD(self):
+        self.fix_path()
+        return SimpleHTTPRequestHandler.do_HEAD(self)
+
+    def fix_path(self):
+        path, query = self.path, ''
+        if '?' in path:
+            path, query = path.split('?', 1)
+            query = '?' + query
+        if path.endswith("/"):
+            path += "index.html"
+        elif "." not in path:
+            path += ".html"
+        self.path = path + query
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            # Directory listings, redirects and 404s
+            return SimpleHTTPRequestHandler.send_head(self)
+
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        ctype = self.guess_type(path)
+        reloader = self.server.reloader
+        inject = reloader is not None and ctype == 'text/html'
+        compress = ctype.startswith(COMPRESSIBLE) and \
+            'Range' not in self.headers and self.accepts_gzip()
+
+        etag = '"%x-%x%s%s"' % (st.st_mtime_ns, st.st_size,
+                                '-live' if inject else '',
+                                '-gzip' if compress else '')
+        last_modified = self.date_time_string(int(st.st_mtime))
+
+        if self.not_modified(etag, int(st.st_mtime)):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.end_headers()
+            return None
+
+        if inject or compress:
+            body = self.server.body(path, stamp, inject, compress)
+            f = io.BytesIO(body)
+            size = len(body)
+        else:
+            try:
+                f = open(path, 'rb')
+            except OSError:
+                self.send_error(404, "File not found")
+                return None
+            size = st.st_size
+
+        byte_range = None
+        if not compress and self.if_range(etag, last_modified):
+            byte_range = self.parse_range(size)
+            if byte_range == ():
+                f.close()
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */%d' % size)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None
+
+        if byte_range:
+            start, end = byte_range
+            f.seek(start)
+            data = f.read(end - start + 1)
+            f.close()
+            f = io.BytesIO(data)
+            self.send_response(206)
+            self.send_header('Content-Range',
+                             'bytes %d-%d/%d' % (start, end, size))
+            size = len(data)
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(size))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        if FINGERPRINTED.search(path):
+            self.send_header('Cache-Control', IMMUTABLE)
+        else:
+            self.send_header('Cache-Control', 'no-cache')
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        if ctype.startswith(COMPRESSIBLE):
+            self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        return f
+
+    def accepts_gzip(self):
+        for coding in self.headers.get('Accept-Encoding', '').split(','):
+            parts = coding.strip().split(';')
+            if parts[0].strip() not in ('gzip', '*'):
+                continue
+            q = [p.strip() for p in parts[1:] if p.strip().startswith('q=')]
+            try:
+                if q and float(q[0][2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+            return True
+        return False
+
+    def not_modified(self, etag, mtime):
+        """
+        Whether the client's copy, named by its conditional headers, is
+        still current.
+        """
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [t.strip() for t in if_none_match.split(',')]
+            return '*' in tags or etag in tags or 'W/' + etag in tags
+
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError, IndexError):
+                return False
+            if since is None:
+                return False
+            return mtime <= since.timestamp()
+        return False
+
+    def if_range(self, etag, last_modified):
+        """
+        Whether a Range header applies to the current version of the file.
+        """
+        validator = self.headers.get('If-Range')
+        return validator is None or validator.strip() in (etag,
+                                                          last_modified)
+
+    def parse_range(self, size):
+        """
+        Return the first and last byte asked for by the Range header, None
+        to send the whole file and an empty tuple if the range can't be
+        satisfied. Only single ranges are supported.
+        """
+        header = self.headers.get('Range')
+        if header is None or not header.startswith('bytes='):
+            return None
+        spec = header[len('bytes='):].strip()
+        if ',' in spec or '-' not in spec:
+            return None
+        first, last = [s.strip() for s in spec.split('-', 1)]
+        try:
+            if not first:
+                # The last ``last`` bytes
+                length = int(last)
+                if length == 0:
+                    return ()
+                return max(size - length, 0), size - 1
+            start = int(first)
+            end = int(last) if last else size - 1
+        except ValueError:
+            return None
+        if start >= size:
+            return ()
+        if start > end:
+            return None
+        return start, min(end, size - 1)
+
+    def send_events(self):
+        """
+        Keep the connection open and send an event after every rebuild.
+        """
+        reloader = self.server.reloader
+        if reloader is None:
+            self.send_error(404, "Live reload is off")
+            return
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        version = reloader.version
+        try:
+            self.wfile.write(b'retry: 1000\n\n')
+            self.wfile.flush()
+            while True:
+                current = reloader.wait(version, KEEPALIVE)
+                if current != version:
+                    version = current
+                    self.wfile.write(b'data: reload\n\n')
+                else:
+                    self.wfile.write(b': keep-alive\n\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        if self.path.split('?', 1)[0] != RELOAD_URL:
+            SimpleHTTPRequestHandler.log_message(self, format, *args)
+
+
+def make_server(directory, port=8000, reloader=None):
+    """
+    Return a server for ``directory``; pass a ``Reloader`` for live reload.
+    """
+    handler = functools.partial(Handler, directory=directory)
+    return Server(('', port), handler, reloader)
+
+
+def _serve(server):
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def serve_in_background(server):
+    """
+    Run ``server`` while the caller goes on building the site. The server
+    gets a forked process of its own where possible: the builder forks
+    worker pools, and forking a process while a server thread holds a lock
+    can leave a worker stuck on it. Returns the process or thread.
+    """
+    if can_fork():
+        worker = get_context().Process(target=_serve, args=(server,))
+    else:
+        worker = threading.Thread(target=_serve, args=(server,))
+    worker.daemon = True
+    worker.start()
+    return worker
@@ -536,7 +536,7 @@ def smartyPants(text, attr=default_smartypants_attr):
                 t = processEscapes(t)
 
                 if convert_quot != "0":
-                    t = re.sub('&quot;', '"', t)
+                    t = t.replace('&quot;', '"')
 
                 if do_dashes != "0":
                     if do_dashes == "1":
@@ -559,13 +559,13 @@ def smartyPants(text, attr=default_smartypants_attr):
                 if do_quotes != "0":
                     if t == "'":
                         # Special case: single-character ' token
-                        if re.match("\S", prev_token_last_char):
+                        if non_space_regex.match(prev_token_last_char):
                             t = "&#8217;"
                         else:
                             t = "&#8216;"
                     elif t == '"':
                         # Special case: single-character " token
-                        if re.match("\S", prev_token_last_char):
+                        if non_space_regex.match(prev_token_last_char):
                             t = "&#8221;"
                         else:
                             t = "&#8220;"
@@ -583,6 +583,80 @@ def smartyPants(text, attr=default_smartypants_attr):
     return "".join(result)
 
 
+# Patterns used by educateQuotes(), compiled once.
+
+punct_class = r"""[!"#\$\%'()*+,-.\/:;<=>?\@\[\\\]\^_`{|}~]"""
+close_class = r"""[^\ \t\r\n\[\{\(\-]"""
+dec_dashes = r"""&#8211;|&#8212;"""
+
+non_space_regex = re.compile(r"\S")
+
+# Special case if the very first character is a quote
+# followed by punctuation at a non-word-break.
+first_single_quote_regex = re.compile(r"""^'(?=%s\\B)""" % (punct_class,))
+first_double_quote_regex = re.compile(r"""^"(?=%s\\B)""" % (punct_class,))
+
+# Special case for double sets of quotes, e.g.:
+#   <p>He said, "'Quoted' words in a larger quote."</p>
+double_single_quotes_regex = re.compile(r""""'(?=\w)""")
+single_double_quotes_regex = re.compile(r"""'"(?=\w)""")
+
+# Special case for decade abbreviations (the '80s):
+decade_regex = re.compile(r"""\b'(?=\d{2}s)""")
+
+# Get most opening single quotes:
+opening_single_quotes_regex = re.compile(r"""
+        (
+            \s          |   # a whitespace char, or
+            &nbsp;      |   # a non-breaking space entity, or
+            --          |   # dashes, or
+            &[mn]dash;  |   # named dash entities
+            %s          |   # or decimal entities
+            &\#x201[34];    # or hex
+        )
+        '                 # the quote
+        (?=\w)            # followed by a word character
+        """ % (dec_dashes,), re.VERBOSE)
+
+closing_single_quotes_regex = re.compile(r"""
+        (%s)
+        '
+        (?!\s | s\b | \d)
+        """ % (close_class,), re.VERBOSE)
+
+closing_single_quotes_s_regex = re.compile(r"""
+        (%s)
+        '
+        (\s | s\b)
+        """ % (close_class,), re.VERBOSE)
+
+# Get most opening double quotes:
+opening_double_quotes_regex = re.compile(r"""
+        (
+            \s          |   # a whitespace char, or
+            &nbsp;      |   # a non-breaking space entity, or
+            --          |   # dashes, or
+            &[mn]dash;  |   # named dash entities
+            %s          |   # or decimal entities
+            &\#x201[34];    # or hex
+        )
+        "                 # the quote
+        (?=\w)            # followed by a word character
+        """ % (dec_dashes,), re.VERBOSE)
+
+# Double closing quotes:
+closing_double_quotes_space_regex = re.compile(r"""
+        #(%s)?   # character that indicates the quote should be closing
+        "
+        (?=\s)
+        """ % (close_class,), re.VERBOSE)
+
+closing_double_quotes_regex = re.compile(r"""
+        (%s)   # character that indicates the quote should be closing
+        "
+        """ % (close_class,), re.VERBOSE)
+
+
 def educateQuotes(str):
     """
     Parameter:  String.
@@ -592,89 +666,37 @@ def educateQuotes(str):
     Example input:  "Isn't this fun?"
     Example output: &#8220;Isn&#8217;t this fun?&#8221;
     """
-
-    punct_class = r"""[!"#\$\%'()*+,-.\/:;<=>?\@\[\\\]\^_`{|}~]"""
-
-    # Special case if the very first character is a quote
-    # followed by punctuation at a non-word-break.
-    # Close the quotes by brute force:
-    str = re.sub(r"""^'(?=%s\\B)""" % (punct_class,), r"""&#8217;""", str)
-    str = re.sub(r"""^"(?=%s\\B)""" % (punct_class,), r"""&#8221;""", str)
-
-    # Special case for double sets of quotes, e.g.:
-    #   <p>He said, "'Quoted' words in a larger quote."</p>
-    str = re.sub(r""""'(?=\w)""", """&#8220;&#8216;""", str)
-    str = re.sub(r"""'"(?=\w)""", """&#8216;&#8220;""", str)
-
-    # Special case for decade abbreviations (the '80s):
-    str = re.sub(r"""\b'(?=\d{2}s)""", r"""&#8217;""", str)
-
-    close_class = r"""[^\ \t\r\n\[\{\(\-]"""
-    dec_dashes = r"""&#8211;|&#8212;"""
-
-    # Get most opening single quotes:
-    opening_single_quotes_regex = re.compile(r"""
-            (
-                \s          |   # a whitespace char, or
-                &nbsp;      |   # a non-breaking space entity, or
-                --          |   # dashes, or
-                &[mn]dash;  |   # named dash entities
-                %s          |   # or decimal entities
-                &\#x201[34];    # or hex
-            )
-            '                 # the quote
-            (?=\w)            # followed by a word character
-            """ % (dec_dashes,), re.VERBOSE)
-    str = opening_single_quotes_regex.sub(r"""\1&#8216;""", str)
-
-    closing_single_quotes_regex = re.compile(r"""
-            (%s)
-            '
-            (?!\s | s\b | \d)
-            """ % (close_class,), re.VERBOSE)
-    str = closing_single_quotes_regex.sub(r"""\1&#8217;""", str)
-
-    closing_single_quotes_regex = re.compile(r"""
-            (%s)
-            '
-            (\s | s\b)
-            """ % (close_class,), re.VERBOSE)
-    str = closing_single_quotes_regex.sub(r"""\1&#8217;\2""", str)
-
-    # Any remaining single quotes should be opening ones:
-    str = re.sub(r"""'""", r"""&#8216;""", str)
-
-    # Get most opening double quotes:
-    opening_double_quotes_regex = re.compile(r"""
-            (
-                \s          |   # a whitespace char, or
-                &nbsp;      |   # a non-breaking space entity, or
-                --          |   # dashes, or
-                &[mn]dash;  |   # named dash entities
-                %s          |   # or decimal entities
-                &\#x201[34];    # or hex
-            )
-            "                 # the quote
-            (?=\w)            # followed by a word character
-            """ % (dec_dashes,), re.VERBOSE)
-    str = opening_double_quotes_regex.sub(r"""\1&#8220;""", str)
-
-    # Double closing quotes:
-    closing_double_quotes_regex = re.compile(r"""
-            #(%s)?   # character that indicates the quote should be closing
-            "
-            (?=\s)
-            """ % (close_class,), re.VERBOSE)
-    str = closing_double_quotes_regex.sub(r"""&#8221;""", str)
-
-    closing_double_quotes_regex = re.compile(r"""
-            (%s)   # character that indicates the quote should be closing
-            "
-            """ % (close_class,), re.VERBOSE)
-    str = closing_double_quotes_regex.sub(r"""\1&#8221;""", str)
-
-    # Any remaining quotes should be opening ones.
-    str = re.sub(r'"', r"""&#8220;""", str)
+    has_single = "'" in str
+    has_double = '"' in str
+    if not (has_single or has_double):
+        return str
+
+    if has_single:
+        str = first_single_quote_regex.sub(r"""&#8217;""", str)
+    if has_double:
+        str = first_double_quote_regex.sub(r"""&#8221;""", str)
+
+    if has_single and has_double:
+        str = double_single_quotes_regex.sub("""&#8220;&#8216;""", str)
+        str = single_double_quotes_regex.sub("""&#8216;&#8220;""", str)
+
+    # The replacements above may have used up all quotes of a kind
+    if has_single and "'" in str:
+        str = decade_regex.sub(r"""&#8217;""", str)
+        str = opening_single_quotes_regex.sub(r"""\1&#8216;""", str)
+        str = closing_single_quotes_regex.sub(r"""\1&#8217;""", str)
+        str = closing_single_quotes_s_regex.sub(r"""\1&#8217;\2""", str)
+
+        # Any remaining single quotes should be opening ones:
+        str = str.replace("'", "&#8216;")
+
+    if has_double and '"' in str:
+        str = opening_double_quotes_regex.sub(r"""\1&#8220;""", str)
+        str = closing_double_quotes_space_regex.sub(r"""&#8221;""", str)
+        str = closing_double_quotes_regex.sub(r"""\1&#8221;""", str)
+
+        # Any remaining quotes should be opening ones.
+        str = str.replace('"', "&#8220;")
 
     return str
 
@@ -688,8 +710,8 @@ def educateBackticks(str):
     Example output: &#8220;Isn't this fun?&#8221;
     """
 
-    str = re.sub(r"""``""", r"""&#8220;""", str)
-    str = re.sub(r"""''""", r"""&#8221;""", str)
+    str = str.replace("``", "&#8220;")
+    str = str.replace("''", "&#8221;")
     return str
 
 
@@ -703,8 +725,8 @@ def educateSingleBackticks(str):
     Example output: &#8216;Isn&#8217;t this fun?&#8217;
     """
 
-    str = re.sub(r"""`""", r"""&#8216;""", str)
-    str = re.sub(r"""'""", r"""&#8217;""", str)
+    str = str.replace("`", "&#8216;")
+    str = str.replace("'", "&#8217;")
     return str
 
 
@@ -715,9 +737,10 @@ def educateDashes(str):
     Returns:    The string, with each instance of "--" translated to
                 an em-dash HTML entity.
     """
-
-    str = re.sub(r"""---""", r"""&#8212;""", str)  # en  (yes, backwards)
-    str = re.sub(r"""--""", r"""&#8211;""", str)  # em (yes, backwards)
+    if "--" not in str:
+        return str
+    str = str.replace("---", "&#8212;")  # en  (yes, backwards)
+    str = str.replace("--", "&#8211;")  # em (yes, backwards)
     return str
 
 
@@ -729,9 +752,10 @@ def educateDashesOldSchool(str):
                 an en-dash HTML entity, and each "---" translated to
                 an em-dash HTML entity.
     """
-
-    str = re.sub(r"""---""", r"""&#8212;""", str)    # em (yes, backwards)
-    str = re.sub(r"""--""", r"""&#8211;""", str)    # en (yes, backwards)
+    if "--" not in str:
+        return str
+    str = str.replace("---", "&#8212;")    # em (yes, backwards)
+    str = str.replace("--", "&#8211;")    # en (yes, backwards)
     return str
 
 
@@ -750,8 +774,10 @@ def educateDashesOldSchoolInverted(str):
                 the shortcut should be shorter to type. (Thanks to Aaron
                 Swartz for the idea.)
     """
-    str = re.sub(r"""---""", r"""&#8211;""", str)    # em
-    str = re.sub(r"""--""", r"""&#8212;""", str)    # en
+    if "--" not in str:
+        return str
+    str = str.replace("---", "&#8211;")    # em
+    str = str.replace("--", "&#8212;")    # en
     return str
 
 
@@ -764,9 +790,10 @@ def educateEllipses(str):
     Example input:  Huh...?
     Example output: Huh&#8230;?
     """
-
-    str = re.sub(r"""\.\.\.""", r"""&#8230;""", str)
-    str = re.sub(r"""\. \. \.""", r"""&#8230;""", str)
+    if "." not in str:
+        return str
+    str = str.replace("...", "&#8230;")
+    str = str.replace(". . .", "&#8230;")
     return str
 
 
@@ -779,17 +806,19 @@ def stupefyEntities(str):
     Example input:  &#8220;Hello &#8212; world.&#8221;
     Example output: "Hello -- world."
     """
+    if "&#82" not in str:
+        return str
 
-    str = re.sub(r"""&#8211;""", r"""-""", str)    # en-dash
-    str = re.sub(r"""&#8212;""", r"""--""", str)   # em-dash
+    str = str.replace("&#8211;", "-")    # en-dash
+    str = str.replace("&#8212;", "--")   # em-dash
 
-    str = re.sub(r"""&#8216;""", r"""'""", str)    # open single quote
-    str = re.sub(r"""&#8217;""", r"""'""", str)    # close single quote
+    str = str.replace("&#8216;", "'")    # open single quote
+    str = str.replace("&#8217;", "'")    # close single quote
 
-    str = re.sub(r"""&#8220;""", r'''"''', str)    # open double quote
-    str = re.sub(r"""&#8221;""", r'''"''', str)    # close double quote
+    str = str.replace("&#8220;", '"')    # open double quote
+    str = str.replace("&#8221;", '"')    # close double quote
 
-    str = re.sub(r"""&#8230;""", r"""...""", str)  # ellipsis
+    str = str.replace("&#8230;", "...")  # ellipsis
 
     return str
 
@@ -810,50 +839,45 @@ def processEscapes(str):
                 \-      &#45;
                 \`      &#96;
     """
-    str = re.sub(r"""\\\\""", r"""&#92;""", str)
-    str = re.sub(r'''\\"''', r"""&#34;""", str)
-    str = re.sub(r"""\\'""", r"""&#39;""", str)
-    str = re.sub(r"""\\\.""", r"""&#46;""", str)
-    str = re.sub(r"""\\-""", r"""&#45;""", str)
-    str = re.sub(r"""\\`""", r"""&#96;""", str)
+    if "\\" not in str:
+        return str
+
+    str = str.replace("\\\\", "&#92;")
+    str = str.replace('\\"', "&#34;")
+    str = str.replace("\\'", "&#39;")
+    str = str.replace("\\.", "&#46;")
+    str = str.replace("\\-", "&#45;")
+    str = str.replace("\\`", "&#96;")
 
     return str
 
 
+tag_soup = re.compile(r"""([^<]*)(<[^>]*>)""")
+
+
 def _tokenize(str):
     """
     Parameter:  String containing HTML markup.
-    Returns:    Reference to an array of the tokens comprising the input
-                string. Each token is either a tag (possibly with nested,
-                tags contained therein, such as <a href="<MTFoo>">, or a
-                run of text between tags. Each element of the array is a
-                two-element array; the first is either 'tag' or 'text';
-                the second is the actual value.
+    Returns:    An iterator over the tokens comprising the input string.
+                Each token is either a tag (possibly with nested, tags
+                contained therein, such as <a href="<MTFoo>">, or a run of
+                text between tags. Each token is a tuple; the first item is
+                either 'tag' or 'text'; the second is the actual value.
 
     Based on the _tokenize() subroutine from Brad Choate's MTRegex plugin.
         <http://www.bradchoate.com/past/mtregex.php>
     """
-
-    tokens = []
-
-    tag_soup = re.compile(r"""([^<]*)(<[^>]*>)""")
-
-    token_match = tag_soup.search(str)
-
+    # A match either starts where the previous one ended or there are no
+    # more tags, so consecutive matches cover the string up to the tail.
     previous_end = 0
-    while token_match is not None:
+    for token_match in tag_soup.finditer(str):
         if token_match.group(1):
-            tokens.append(['text', token_match.group(1)])
-
-        tokens.append(['tag', token_match.group(2)])
-
+            yield 'text', token_match.group(1)
+        yield 'tag', token_match.group(2)
         previous_end = token_match.end()
-        token_match = tag_soup.search(str, token_match.end())
 
     if previous_end < len(str):
-        tokens.append(['text', str[previous_end:]])
-
-    return tokens
+        yield 'text', str[previous_end:]
 
 
 __author__ = "Chad Miller <smartypantspy@chad.org>"
@@ -6,15 +6,27 @@ BSD licensed
 """
 import os
 import sys
-import shutil
-import yaml
 import json
+import pickle
 from datetime import datetime
 
-from .renderers import DjangoRenderer, Jinja2Renderer
+from .renderers import Context, DjangoRenderer, Jinja2Renderer
 from .models import Post, Page
-from .utils import slugify
+from .utils import slugify, write_file, load_yaml
 from .exceptions import ConfigurationError
+from .parallel import (get_jobs, init_worker, load_file, load_contents,
+                       map_jobs, map_threads)
+from .scheduler import RenderQueue
+from .cache import ArtifactCache, LRUCache
+from . import highlight
+from .graph import BuildGraph
+from .media import sync_tree, LINK_MODES
+from . import compress
+from . import assets
+from .search import SearchIndex, post_terms, terms_key
+from .minify import minify
+from . import profiling
+from .profiling import profiled
 
 
 DEFAULTS = {
@@ -35,12 +47,29 @@ DEFAULTS = {
     'sitemap_urls': ['about'],
     'punctuation': False,
     'ligatures': False,
-    'deploy_dir': 'deploy'
+    'deploy_dir': 'deploy',
+    'jobs': 1,
+    'media_links': 'copy',
+    'highlight_cache_size': 32,
+    'excerpt_words': 30,
+    'precompress': False,
+    'minify': False,
+    'fingerprint_media': False,
+    'search_index': False,
+    'related_posts': 0
 }
 
 
 AVAILABLE_EXTENSIONS = ['markdown', 'rst', 'textile', 'html', 'extension']
 POST_CACHE_FILENAME = '.post-cache.json'
+CACHE_DIRNAME = '.socrates-cache'
+PROFILE_FILENAME = 'socrates-profile.json'
+ASSET_STAMPS_FILENAME = 'assets.json'
+SEARCH_STATE_FILENAME = 'search.json'
+RELATED_STATE_FILENAME = 'related.pickle'
+
+# Settings that affect every generated file
+OUTPUT_SETTINGS = ['minify']
 
 
 class Generator(object):
@@ -64,40 +93,106 @@ class Generator(object):
     DEPLOY = None
     POSTS = None
     PAGES = None
+    CACHE = None
 
     # Global, site-wide settings
     SETTINGS = None
 
-    def __init__(self, directory, silent=False):
+    # Template renderer, kept between builds
+    template = None
+    template_type = None
+
+    def __init__(self, directory, silent=False, jobs=None, profile=False):
         m = os.getcwd()
         self.ROOT = os.path.join(m, directory)
         self.silent = silent
+        self.jobs_option = jobs
+        # Posts and pages of the previous build by path, along with the
+        # modification time and size of their source files
+        self.loaded = {}
+        self.loaded_settings = None
+        # Whether the previous build went all the way through
+        self.complete = False
+        if profile:
+            profiling.enable()
 
         if not os.path.exists(self.ROOT):
             sys.stderr.write("The '%s' directory doesn't exist.\n" % directory)
             return
+
+        self.build()
+        if profile:
+            self.save_profile()
+
+    @profiled('build')
+    def build(self, changed=None):
+        """
+        Generate the whole site. Can be called again to rebuild it, only
+        files that have changed since are parsed again. ``changed`` is the
+        set of paths that have changed since the previous build, as ``watch``
+        reports them. Posts, pages and media files that aren't in it are
+        then taken to be the same as before and aren't even looked at.
+        """
+        complete = self.complete
+        self.complete = False
         self.SETTINGS = self._get_settings()
+        if self.jobs_option is not None:
+            self.SETTINGS['jobs'] = self.jobs_option
+        if self.SETTINGS != self.loaded_settings:
+            # Posts and pages are parsed according to the settings
+            self.loaded = {}
+            self.loaded_settings = self.SETTINGS
+            complete = False
+        self.changed = None
+        if changed is not None and complete:
+            self.changed = set(os.path.normpath(p) for p in changed)
+        try:
+            self.jobs = get_jobs(self.SETTINGS['jobs'])
+        except ConfigurationError:
+            sys.stderr.write("WARNING: jobs should be a number.\n")
+            sys.exit(1)
         # Set up deploy directory
         self.DEPLOY = os.path.join(self.ROOT, self.SETTINGS['deploy_dir'])
         self.deploy_dir_created = False
         if not os.path.exists(self.DEPLOY):
             os.mkdir(self.DEPLOY)
             self.deploy_dir_created = True
-        # Copy media files to deploy destination
-        if os.path.exists(os.path.join(self.DEPLOY, 'media')):
-            shutil.rmtree(os.path.join(self.DEPLOY, 'media'))
-        shutil.copytree(os.path.join(self.ROOT, 'layout', 'media'),
-                        os.path.join(self.DEPLOY, 'media'))
+            self.changed = None
+        media_changed = self._may_have_changed(
+            os.path.join(self.ROOT, 'layout', 'media'))
+        if media_changed:
+            self.sync_media()
 
         self.POSTS = os.path.join(self.ROOT, 'posts')
         self.PAGES = os.path.join(self.ROOT, 'pages')
+        self.CACHE = os.path.join(self.ROOT, CACHE_DIRNAME)
+        self.artifacts = ArtifactCache(os.path.join(self.CACHE, 'posts'))
+        self.highlights = LRUCache(
+            os.path.join(self.CACHE, 'highlight'),
+            self.SETTINGS['highlight_cache_size'] * 1024 * 1024)
+        highlight.use_cache(self.highlights)
+        self.written = []
+
+        if not self.SETTINGS['inline_css']:
+            self.make_pygments_css()
+        if media_changed:
+            self.make_asset_manifest()
 
         if self.SETTINGS['text_processor'] not in AVAILABLE_EXTENSIONS:
             ext = self.SETTINGS['text_processor']
             sys.stderr("WARNING: %s isn't a recognizeed text processor.\n"
                        % ext)
             sys.exit(1)
-        self.init_template_renderer()
+        if self.template is not None and \
+                self.template_type == self.SETTINGS['templates']:
+            self.template.reset()
+        else:
+            self.init_template_renderer()
+        self.graph = BuildGraph(
+            os.path.join(self.ROOT, 'layout'), self.get_post_cache(),
+            dict((k, self.SETTINGS[k]) for k in OUTPUT_SETTINGS),
+            {'asset': self.assets})
+        self.renders = RenderQueue(self)
 
         self.posts = []
         self.pages = []
@@ -106,15 +201,15 @@ class Generator(object):
         self.archives = {}
 
         self.load_posts()
-        self.cache_data = self.get_post_cache()
+        self.make_related_posts()
         self.process_posts()
 
         if os.path.exists(self.PAGES):
             self.load_pages()
             self.process_pages()
 
-        self.SETTINGS = dict(self.SETTINGS, **{'categories': self.categories})
-        self.SETTINGS = dict(self.SETTINGS, **{'years': self.years})
+        self.SETTINGS = Context({'categories': self.categories,
+                                 'years': self.years}, self.SETTINGS)
 
         # Create html files
         self.make_index_page()
@@ -128,17 +223,131 @@ class Generator(object):
 
         self.make_pagination()
 
-        if not self.SETTINGS['inline_css']:
-            from pygments.formatters import HtmlFormatter
-            formatter = HtmlFormatter(**self.SETTINGS['pygments'])
-            css_content = formatter.get_style_defs('.highlight')
-            self._write_to_file(
-                os.path.join(self.DEPLOY, 'media', 'pygments.css'),
-                css_content)
+        self.load_contents()
+        self.log('Rendering...')
+        self.renders.run()
+
+        if self.SETTINGS['search_index']:
+            self.make_search_index()
+        if self.SETTINGS['precompress']:
+            self.precompress()
 
         self.save_post_cache()
+        keep = set()
+        for f in self.posts + self.pages:
+            keep.update([f.artifact_key, f.contents_key])
+        self.loaded = dict((f.path, self.loaded[f.path])
+                           for f in self.posts + self.pages)
+        keep.update(f.excerpt_key for f in self.posts)
+        if self.SETTINGS['search_index'] or self.SETTINGS['related_posts']:
+            keep.update(terms_key(f) for f in self.posts)
+        self.artifacts.prune(keep)
+        self.highlights.trim()
+        self.complete = True
         self.log("Success!")
 
+    @profiled('sync media')
+    def sync_media(self):
+        """
+        Copy new and changed media files to deploy destination
+        """
+        if self.SETTINGS['media_links'] not in LINK_MODES:
+            sys.stderr.write("WARNING: media_links should be one of %s.\n"
+                             % ', '.join(LINK_MODES))
+            sys.exit(1)
+        keep = ['pygments.css']
+        if self.SETTINGS['fingerprint_media']:
+            # Fingerprinted copies are removed once they're out of date
+            keep.append(assets.MANIFEST_FILENAME)
+            keep.extend(os.path.relpath(name, 'media') for name in
+                        assets.load_manifest(self._manifest_path()).values())
+        self.media_files = sync_tree(
+            os.path.join(self.ROOT, 'layout', 'media'),
+            os.path.join(self.DEPLOY, 'media'),
+            link=self.SETTINGS['media_links'], keep=keep,
+            siblings=compress.SUFFIXES)
+
+    def _manifest_path(self):
+        return os.path.join(self.DEPLOY, 'media', assets.MANIFEST_FILENAME)
+
+    @profiled('fingerprint media')
+    def make_asset_manifest(self):
+        """
+        Give every media file a fingerprinted copy and write the manifest the
+        ``asset`` template filter uses. Only new and changed files are hashed.
+        """
+        self.assets = {}
+        if self.SETTINGS['fingerprint_media']:
+            stamps_path = os.path.join(self.CACHE, ASSET_STAMPS_FILENAME)
+            stamps = {}
+            if os.path.exists(stamps_path):
+                with open(stamps_path) as f:
+                    stamps = json.loads(f.read())
+            manifest_path = self._manifest_path()
+            self.assets, stamps = assets.build_manifest(
+                self.DEPLOY, 'media', assets.load_manifest(manifest_path),
+                stamps)
+            if self._write_to_file(manifest_path, json.dumps(
+                    self.assets, indent=4, sort_keys=True)):
+                self.written.append(manifest_path)
+            if not os.path.exists(self.CACHE):
+                os.makedirs(self.CACHE)
+            with open(stamps_path, 'w') as f:
+                f.write(json.dumps(stamps))
+        assets.use_manifest(self.assets)
+
+    @profiled('pygments css')
+    def make_pygments_css(self):
+        from pygments.formatters import HtmlFormatter
+        formatter = HtmlFormatter(**self.SETTINGS['pygments'])
+        css_content = formatter.get_style_defs('.highlight')
+        css_path = os.path.join(self.DEPLOY, 'media', 'pygments.css')
+        if self._write_to_file(css_path, css_content):
+            self.written.append(css_path)
+
+    @profiled('search index')
+    def make_search_index(self):
+        """
+        Write the search index of all posts to ``deploy/search``. The words
+        of every post are cached, and only new and changed posts are
+        tokenized and updated in the index.
+        """
+        path = os.path.join(self.CACHE, SEARCH_STATE_FILENAME)
+        state = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.loads(f.read())
+        index = SearchIndex(os.path.join(self.DEPLOY, 'search'), state)
+        self.written.extend(index.build(self.posts, self.artifacts))
+        if not os.path.exists(self.CACHE):
+            os.makedirs(self.CACHE)
+        with open(path, 'w') as f:
+            f.write(json.dumps(index.get_state()))
+
+    @profiled('precompress')
+    def precompress(self):
+        """
+        Write gzip (and brotli) compressed copies of the HTML, XML, CSS and
+        JavaScript files in the deploy directory. Files that haven't changed
+        since they were last compressed are skipped.
+        """
+        encoders = compress.get_encoders()
+        stale = compress.find_stale(self.DEPLOY, encoders)
+        if not stale:
+            return
+        self.log('Compressing %d files...' % len(stale))
+        map_threads(lambda path: compress.compress_file(path, encoders),
+                    stale, self.jobs)
+
+    def save_profile(self):
+        """
+        Print the timings of this build and save them as JSON next to the
+        deploy directory.
+        """
+        profiler = profiling.get_profiler()
+        self.log(profiler.report())
+        profiler.save(os.path.join(self.ROOT, PROFILE_FILENAME))
+
     def init_template_renderer(self):
         """
         Create and save a reference to an instance of a template renderer
@@ -146,12 +355,15 @@ class Generator(object):
         t = self.SETTINGS['templates']
         layout = os.path.join(self.ROOT, 'layout')
         if t == 'jinja2':
-            self.template = Jinja2Renderer(layout)
+            self.template = Jinja2Renderer(
+                layout, os.path.join(self.CACHE, 'jinja2'))
         elif t == 'django':
             self.template = DjangoRenderer(layout)
         else:
             raise NotImplementedError("I don't know this template type.")
+        self.template_type = t
 
+    @profiled('render template')
     def render(self, template, values):
         """
         Give a template name and a dict of values, return an HTML
@@ -159,6 +371,16 @@ class Generator(object):
         """
         return self.template.render(template, values)
 
+    def render_job(self, job):
+        """
+        Render a queued ``RenderJob`` and write it to disk. Returns ``True``
+        if the file has changed.
+        """
+        contents = self.render(job.template, self._v(job.site, job.values))
+        if job.postprocess is not None:
+            contents = job.postprocess(contents)
+        return self._write_to_file(job.path, contents)
+
     def log(self, text):
         """
         A thin wrapper around the ``print`` statement to allow silencing of all
@@ -172,13 +394,7 @@ class Generator(object):
         Return page number as a string for pagination.
         """
         current += 1
-        if total < 10:
-            return str(current)
-        elif 10 <= total < 100:
-            if total < 10:
-                return '0%d' % current
-            else:
-                return str(current)
+        return str(current)
 
     def _get_post_cats(self, post):
         """
@@ -199,22 +415,112 @@ class Generator(object):
         if not os.path.exists(s):
             raise Exception('No config file.')
         c = open(s, 'r').read()
-        return dict(DEFAULTS, **yaml.load(c))
+        return dict(DEFAULTS, **load_yaml(c))
 
+    @profiled('write file')
     def _write_to_file(self, path, contents):
         """
-        Create a file (path) with contents
+        Create a file (path) with contents. Files that already have the same
+        contents are left untouched. Returns ``True`` if the file was written.
+        """
+        if self.SETTINGS['minify']:
+            contents = minify(path, contents)
+        return write_file(path, contents.encode("utf-8"))
+
+    def _v(self, site, vals):
+        """
+        Put the local template vals on top of the global config
+        """
+        return Context(vals, site)
+
+    def _load_files(self, cls, directory, filenames):
+        """
+        Create ``cls`` instances for all the files, using a pool of ``jobs``
+        worker processes. Exits on the first file that can't be parsed.
+        """
+        items = []
+        for filename in filenames:
+            if not filename.startswith('.') and not filename.startswith('_'):
+                items.append((cls, os.path.join(directory, filename)))
+
+        # Reuse what the previous build has loaded from unchanged files
+        objects = [None] * len(items)
+        todo = []
+        for i, (cls, path) in enumerate(items):
+            previous = self.loaded.get(path)
+            if previous is not None and previous[1].__class__ is cls and \
+                    not self._may_have_changed(path):
+                objects[i] = previous[1]
+                continue
+            stamp = self._get_stamp(path)
+            if previous is not None and previous[0] == stamp and \
+                    previous[1].__class__ is cls:
+                objects[i] = previous[1]
+            else:
+                todo.append((i, stamp))
+
+        results = map_jobs(load_file, [items[i] for i, stamp in todo],
+                           self.jobs, init_worker,
+                           (self.SETTINGS, self.artifacts))
+
+        for (i, stamp), (status, obj, stats) in zip(todo, results):
+            profiling.merge(stats)
+            self._check_status(status, items[i][1])
+            objects[i] = obj
+            self.loaded[obj.path] = (stamp, obj)
+
+        for obj in objects:
+            obj.context = self.SETTINGS
+        return objects
+
+    def _may_have_changed(self, path):
+        """
+        Whether ``path``, or anything inside of it, may have changed since
+        the previous build. Only ``False`` when the caller of ``build`` told
+        us what has changed.
         """
-        f = open(path, 'w')
-        f.write(contents.encode("utf-8"))
-        f.close()
+        if self.changed is None:
+            return True
+        path = os.path.normpath(path)
+        return any(p == path or p.startswith(path + os.sep)
+                   for p in self.changed)
 
-    def _v(self, vals):
+    def _get_stamp(self, path):
+        st = os.stat(path)
+        return (st.st_mtime, st.st_size)
+
+    def _check_status(self, status, path):
         """
-        Create a joint dict of global config and local template vals
+        Exit if a worker couldn't parse the file at ``path``.
         """
-        return dict(self.SETTINGS, **vals)
+        filename = os.path.basename(path)
+        if status == 'config':
+            sys.stderr.write("WARNING: %s isn't configured properly.\n"
+                             % filename)
+            sys.exit(1)
+        elif status == 'error':
+            sys.stderr.write("ERROR: couldn't parse %s.\n" % filename)
+            sys.exit(1)
 
+    @profiled('load contents')
+    def load_contents(self, files=None):
+        """
+        Posts and pages are loaded with their front matter only. Render the
+        bodies that the queued render jobs (or ``files``) need and that
+        aren't cached, using a pool of ``jobs`` worker processes. Bodies of
+        posts that aren't being written are never rendered.
+        """
+        if files is None:
+            files = self.renders.files()
+        results = map_jobs(load_contents, files, self.jobs, init_worker,
+                           (self.SETTINGS, self.artifacts))
+        for f, (status, contents, stats) in zip(files, results):
+            profiling.merge(stats)
+            self._check_status(status, f.path)
+            f.context = self.SETTINGS
+            f.contents = contents
+
+    @profiled('load posts')
     def load_posts(self):
         """
         Get all files from the posts directory, create Post instances and add
@@ -223,37 +529,70 @@ class Generator(object):
         filenames = os.listdir(self.POSTS)
         filenames.sort()
 
-        for filename in filenames:
-            if not filename.startswith('.') and not filename.startswith('_'):
-                p = os.path.join(self.POSTS, filename)
-                try:
-                    self.posts.append(Post(p, self.SETTINGS))
-                except ConfigurationError:
-                    sys.stderr.write("WARNING: %s isn't configured properly.\n"
-                                     % filename)
-                    sys.exit(1)
-                except:
-                    sys.stderr.write("ERROR: couldn't parse %s.\n"
-                                     % filename)
-                    sys.exit(1)
-
+        self.posts.extend(self._load_files(Post, self.POSTS, filenames))
         self.posts.reverse()
 
+    @profiled('related posts')
+    def make_related_posts(self):
+        """
+        Find the ``related_posts`` most similar posts of every post. Only
+        new and changed posts are compared with all the others.
+        """
+        try:
+            count = int(self.SETTINGS['related_posts'] or 0)
+        except (TypeError, ValueError):
+            sys.stderr.write("WARNING: related_posts should be a number.\n")
+            sys.exit(1)
+        if count <= 0:
+            for post in self.posts:
+                post.related = ()
+            return
+        try:
+            from .related import RelatedPosts
+        except ImportError:
+            sys.stderr.write("WARNING: related_posts needs NumPy and "
+                             "SciPy.\n")
+            sys.exit(1)
+
+        path = os.path.join(self.CACHE, RELATED_STATE_FILENAME)
+        state = None
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    state = pickle.load(f)
+            except (IOError, OSError, EOFError, pickle.UnpicklingError,
+                    AttributeError, ImportError):
+                pass
+
+        posts = dict((p.path, p) for p in self.posts)
+        keys = dict((p.path, terms_key(p)) for p in self.posts)
+        related = RelatedPosts(count, state)
+        # Words of new and changed posts come from their bodies
+        self.load_contents([p for p in self.posts
+                            if keys[p.path] != related.keys.get(p.path) and
+                            keys[p.path] not in self.artifacts and
+                            not p.has_contents()])
+        results = related.update(
+            [p.path for p in self.posts], keys,
+            lambda path: post_terms(posts[path], self.artifacts))
+        for post in self.posts:
+            post.related = [posts[p] for p in results[post.path]]
+
+        if not os.path.exists(self.CACHE):
+            os.makedirs(self.CACHE)
+        with open(path, 'wb') as f:
+            pickle.dump(related.get_state(), f, pickle.HIGHEST_PROTOCOL)
+
+    @profiled('load pages')
     def load_pages(self):
         """
-        Get all files from the posts directory, create Post instances and add
-        them to the self.posts list.
+        Get all files from the pages directory, create Page instances and add
+        them to the self.pages list.
         """
-        for filename in os.listdir(self.PAGES):
-            if not filename.startswith('.') and not filename.startswith('_'):
-                p = os.path.join(self.PAGES, filename)
-                try:
-                    self.pages.append(Page(p, self.SETTINGS))
-                except ConfigurationError:
-                    sys.stderr.write("WARNING: %s isn't configured properly.\n"
-                                     % filename)
-                    sys.exit(1)
+        filenames = os.listdir(self.PAGES)
+        self.pages.extend(self._load_files(Page, self.PAGES, filenames))
 
+    @profiled('process posts')
     def process_posts(self):
         """
         Collect all the necessary information about posts.
@@ -293,23 +632,10 @@ class Generator(object):
     def process_pages(self):
         self.save_pages()
 
+    @profiled('queue posts')
     def save_posts(self):
         self.log('Saving posts...')
         for post in self.posts:
-
-            # TODO: All of this caching needs to happen much sooner than here
-            # because the posts have already been parsed.
-            try:
-                old_hash = self.cache_data[post.path]
-            except KeyError:
-                old_hash = None
-
-            new_hash = post.hash_file()
-            self.cache_data[post.path] = new_hash
-
-            if old_hash == new_hash:
-                continue
-
             # Save the thing
             b = post.slug + '.html'
 
@@ -324,13 +650,11 @@ class Generator(object):
             else:
                 t = self.SINGLE
 
-            content = self.render(t, self._v({'post': post}))
-
-            # Print filename to show progress
-            self.log(post.filename)
-
-            self._write_to_file(m, content)
+            # Filename is logged to show progress once it's written
+            self.renders.add(m, t, {'post': post},
+                             name=post.filename)
 
+    @profiled('queue pages')
     def save_pages(self):
         self.log('Saving pages...')
         for page in self.pages:
@@ -344,11 +668,8 @@ class Generator(object):
             else:
                 t = self.PAGE
 
-            content = self.render(t, self._v({'page': page}))
-
-            # Print filename to show progress
-            self.log(page.filename)
-            self._write_to_file(m, content)
+            self.renders.add(m, t, {'page': page},
+                             name=page.filename)
 
     def make_post_directories(self):
         """
@@ -389,6 +710,7 @@ class Generator(object):
                         if not os.path.exists(m):
                             os.mkdir(m)
 
+    @profiled('queue index')
     def make_index_page(self):
         """
         Create an index page
@@ -407,21 +729,21 @@ class Generator(object):
         else:
             posts = self.posts
             extra = False
-        contents = self.render(self.INDEX,
-                               self._v({'posts': posts, 'extra': extra}))
-        self._write_to_file(m, contents)
+        self.renders.add(m, self.INDEX,
+                         {'posts': posts, 'extra': extra})
 
+    @profiled('queue sitemap')
     def make_sitemap(self):
         """
         Generate a sitemap.
         """
         m = os.path.join(self.DEPLOY, 'sitemap.xml')
         posts = self.posts
-        contents = self.render(self.SITEMAP, self._v({
+        self.renders.add(m, self.SITEMAP, {
             'posts': posts,
-            'now': self._get_atom_date()}))
-        self._write_to_file(m, contents)
+            'now': self._get_atom_date()})
 
+    @profiled('queue atom')
     def make_atom(self):
         """
         Create an atom feed
@@ -437,18 +759,19 @@ class Generator(object):
             posts = self.posts[:n]
         else:
             posts = self.posts
-        contents = self.render(self.ATOM,
-                               self._v({'posts': posts,
-                                        'now': self._get_atom_date()}))
+        self.renders.add(m, self.ATOM,
+                         {'posts': posts, 'now': self._get_atom_date()},
+                         postprocess=self._clean_atom)
 
-        contents = contents.replace('&nbsp;', '')
-        self._write_to_file(m, contents)
+    def _clean_atom(self, contents):
+        return contents.replace('&nbsp;', '')
 
     def _get_atom_date(self):
         date = datetime.utcnow()
         d = date.strftime('%Y-%m-%dT%H:%M:%S%z')
         return d + "Z"
 
+    @profiled('queue categories')
     def make_category_pages(self):
         """
         Make category pages. They go into the 'category' directory.
@@ -466,11 +789,11 @@ class Generator(object):
                 if not os.path.exists(p):
                     os.mkdir(p)
                 posts = self.categories[k]
-                contents = self.render(
-                    self.CATEGORY, self._v({'category': k, 'posts': posts}))
                 m = os.path.join(p, 'index.html')
-                self._write_to_file(m, contents)
+                self.renders.add(
+                    m, self.CATEGORY, {'category': k, 'posts': posts})
 
+    @profiled('queue archives')
     def make_archive_pages(self):
         """
         Make archive pages. Only by year.
@@ -487,11 +810,11 @@ class Generator(object):
                 if not os.path.exists(p):
                     os.mkdir(p)
                 posts = self.archives[k]
-                contents = self.render(
-                    self.ARCHIVE, self._v({'year': k, 'posts': posts}))
                 m = os.path.join(p, 'index.html')
-                self._write_to_file(m, contents)
+                self.renders.add(
+                    m, self.ARCHIVE, {'year': k, 'posts': posts})
 
+    @profiled('queue pagination')
     def make_pagination(self):
         """
         Make pagination.
@@ -505,7 +828,7 @@ class Generator(object):
             return
         self.log('Creating pagination...')
         num = len(self.posts)
-        pages = num / per
+        pages = num // per
 
         m = os.path.join(self.DEPLOY, 'page')
         if not os.path.exists(m):
@@ -538,17 +861,25 @@ class Generator(object):
             if not os.path.exists(e):
                 os.mkdir(e)
 
-            contents = self.render(self.PAGED, self._v(v))
             c = os.path.join(e, "index.html")
-            self._write_to_file(c, contents)
+            self.renders.add(c, self.PAGED, v)
 
     def get_post_cache(self):
-        if not os.path.exists(POST_CACHE_FILENAME) or self.deploy_dir_created:
+        """
+        Load the signatures of all output files from the previous build.
+        """
+        path = os.path.join(self.CACHE, POST_CACHE_FILENAME)
+        if not os.path.exists(path) or self.deploy_dir_created:
             return {}
 
-        return json.loads(open(POST_CACHE_FILENAME).read())
+        with open(path) as f:
+            return json.loads(f.read())
 
+    @profiled('save cache')
     def save_post_cache(self):
         self.log("Saving cache")
-        with open(POST_CACHE_FILENAME, 'w') as f:
-            f.write(json.dumps(self.cache_data, indent=4))
+        if not os.path.exists(self.CACHE):
+            os.makedirs(self.CACHE)
+        path = os.path.join(self.CACHE, POST_CACHE_FILENAME)
+        with open(path, 'w') as f:
+            f.write(json.dumps(self.graph.current, indent=4))
@@ -0,0 +1,11 @@
+"""
+Django template filter for fingerprinted media files, see
+``socrates.assets``.
+"""
+from django import template
+
+from .. import assets
+
+register = template.Library()
+
+register.filter('asset', assets.asset)
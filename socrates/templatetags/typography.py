@@ -0,0 +1,20 @@
+"""
+Django template filters for the typography functions in
+``socrates.typography``.
+"""
+from django import template
+from django.utils.safestring import mark_safe
+
+from .. import typography
+
+register = template.Library()
+
+
+def _safe(func):
+    def wrapper(text):
+        return mark_safe(func(text))
+    return wrapper
+
+
+for name, func in typography.FILTERS.items():
+    register.filter(name, _safe(func), is_safe=True)
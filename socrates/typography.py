@@ -1,37 +1,94 @@
+"""
+Typographic filters, ported from typogrify. These work on plain strings
+and don't depend on any template engine. The template adapters live in
+``socrates.templatetags.typography`` (Django) and ``Jinja2Renderer``.
+"""
 import re
-from django import template
-from django.utils.safestring import mark_safe
-from django.utils.encoding import force_unicode
 
-register = template.Library()
+from .profiling import profiled
 
+# it kinda sucks but it fixes the standalone amps in attributes bug
+TAG_PATTERN = \
+    '</?\w+((\s+\w+(\s*=\s*(?:".*?"|\'.*?\'|[^\'">\s]+))?)+\s*|\s*)/?>'
 
-def amp(text):
-    """Wraps apersands in HTML with ``<span class="amp">`` so they can be
-    styled with CSS. Apersands are also normalized to ``&amp;``. Requires
-    ampersands to have whitespace or an ``&nbsp;`` on both sides.
+AMP_FINDER = re.compile(r"(\s|&nbsp;)(&|&amp;|&\#38;)(\s|&nbsp;)")
+INTRA_TAG_FINDER = re.compile(
+    r'(?P<prefix>(%s)?)(?P<text>([^<]*))(?P<suffix>(%s)?)' %
+    (TAG_PATTERN, TAG_PATTERN))
+
+CAP_FINDER = re.compile(r"""(
+                        (\b[A-Z\d]*
+                        [A-Z]\d*[A-Z]
+                        [A-Z\d']*\b)
+                        | (\b[A-Z]+\.\s?
+                        (?:[A-Z]+\.\s?)+)
+                        (?:\s|\b|$))
+                        """, re.VERBOSE)
+
+QUOTE_FINDER = re.compile(r"""((<(p|h[1-6]|li|dt|dd)[^>]*>|^)
+                              \s*
+                              (<(a|em|span|strong|i|b)[^>]*>\s*)*)
+                              (("|&ldquo;|&\#8220;)|('|&lsquo;|&\#8216;))
+                              """, re.VERBOSE)
+
+WIDONT_FINDER = re.compile(r"""((?:</?(?:a|em|span|strong|i|b)[^>]*>)|[^<>\s])
+                               \s+
+                               ([^<>\s]+
+                               \s*
+                               (</(a|em|span|strong|i|b)>\s*)*
+                               ((</(p|h[1-6]|li|dt|dd)>)|$))
+                               """, re.VERBOSE)
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return str(value)
+
+
+def _amp_process(groups):
+    prefix = groups.group('prefix') or ''
+    text = AMP_FINDER.sub(r"""\1<span class="amp">&amp;</span>\3""",
+                          groups.group('text'))
+    suffix = groups.group('suffix') or ''
+    return prefix + text + suffix
+
+
+def _cap_wrapper(matchobj):
     """
-    text = force_unicode(text)
-    # it kinda sucks but it fixes the standalone amps in attributes bug
-    tag_pattern = \
-        '</?\w+((\s+\w+(\s*=\s*(?:".*?"|\'.*?\'|[^\'">\s]+))?)+\s*|\s*)/?>'
-    amp_finder = re.compile(r"(\s|&nbsp;)(&|&amp;|&\#38;)(\s|&nbsp;)")
-    intra_tag_finder = re.compile(
-        r'(?P<prefix>(%s)?)(?P<text>([^<]*))(?P<suffix>(%s)?)' %
-        (tag_pattern, tag_pattern))
+    This is necessary to keep dotted cap strings to pick up extra spaces
+    """
+    if matchobj.group(2):
+        return """<span class="caps">%s</span>""" % matchobj.group(2)
+    else:
+        if matchobj.group(3)[-1] == " ":
+            caps = matchobj.group(3)[:-1]
+            tail = ' '
+        else:
+            caps = matchobj.group(3)
+            tail = ''
+        return """<span class="caps">%s</span>%s""" % (caps, tail)
 
-    def _amp_process(groups):
-        prefix = groups.group('prefix') or ''
-        text = amp_finder.sub(r"""\1<span class="amp">&amp;</span>\3""",
-                              groups.group('text'))
-        suffix = groups.group('suffix') or ''
-        return prefix + text + suffix
 
-    output = intra_tag_finder.sub(_amp_process, text)
-    return mark_safe(output)
+def _quote_wrapper(matchobj):
+    if matchobj.group(7):
+        classname = "dquo"
+        quote = matchobj.group(7)
+    else:
+        classname = "quo"
+        quote = matchobj.group(8)
+    return """%s<span class="%s">%s</span>""" % (
+        matchobj.group(1), classname, quote)
 
 
-amp.is_safe = True
+def amp(text):
+    """Wraps apersands in HTML with ``<span class="amp">`` so they can be
+    styled with CSS. Apersands are also normalized to ``&amp;``. Requires
+    ampersands to have whitespace or an ``&nbsp;`` on both sides.
+    """
+    text = _text(text)
+    output = INTRA_TAG_FINDER.sub(_amp_process, text)
+    return output
 
 
 def caps(text):
@@ -41,7 +98,7 @@ def caps(text):
     >>> caps("A message from KU")
     u'A message from <span class="caps">KU</span>'
     """
-    text = force_unicode(text)
+    text = _text(text)
     try:
         from . import smartypants
     except ImportError:
@@ -52,38 +109,11 @@ def caps(text):
     result = []
     in_skipped_tag = False
 
-    cap_finder = re.compile(r"""(
-                            (\b[A-Z\d]*
-                            [A-Z]\d*[A-Z]
-                            [A-Z\d']*\b)
-                            | (\b[A-Z]+\.\s?
-                            (?:[A-Z]+\.\s?)+)
-                            (?:\s|\b|$))
-                            """, re.VERBOSE)
-
-    def _cap_wrapper(matchobj):
-        """
-        This is necessary to keep dotted cap strings to pick up extra spaces
-        """
-        if matchobj.group(2):
-            return """<span class="caps">%s</span>""" % matchobj.group(2)
-        else:
-            if matchobj.group(3)[-1] == " ":
-                caps = matchobj.group(3)[:-1]
-                tail = ' '
-            else:
-                caps = matchobj.group(3)
-                tail = ''
-            return """<span class="caps">%s</span>%s""" % (caps, tail)
-
-    tags_to_skip_regex = re.compile("<(/)?(?:pre|code|kbd|script|math)[^>]*>",
-                                    re.IGNORECASE)
-
     for token in tokens:
         if token[0] == "tag":
             # Don't mess with tags.
             result.append(token[1])
-            close_match = tags_to_skip_regex.match(token[1])
+            close_match = smartypants.tags_to_skip_regex.match(token[1])
             if close_match and close_match.group(1) is None:
                 in_skipped_tag = True
             else:
@@ -92,12 +122,9 @@ def caps(text):
             if in_skipped_tag:
                 result.append(token[1])
             else:
-                result.append(cap_finder.sub(_cap_wrapper, token[1]))
+                result.append(CAP_FINDER.sub(_cap_wrapper, token[1]))
     output = "".join(result)
-    return mark_safe(output)
-
-
-caps.is_safe = True
+    return output
 
 
 def initial_quotes(text):
@@ -106,28 +133,9 @@ def initial_quotes(text):
     ``(h1-h6, p, li, dt, dd)`` and also accounts for potential opening inline
     elements ``a, em, strong, span, b, i``
     """
-    text = force_unicode(text)
-    quote_finder = re.compile(r"""((<(p|h[1-6]|li|dt|dd)[^>]*>|^)
-                                  \s*
-                                  (<(a|em|span|strong|i|b)[^>]*>\s*)*)
-                                  (("|&ldquo;|&\#8220;)|('|&lsquo;|&\#8216;))
-                                  """, re.VERBOSE)
-
-    def _quote_wrapper(matchobj):
-        if matchobj.group(7):
-            classname = "dquo"
-            quote = matchobj.group(7)
-        else:
-            classname = "quo"
-            quote = matchobj.group(8)
-        return """%s<span class="%s">%s</span>""" % (
-            matchobj.group(1), classname, quote)
-
-    output = quote_finder.sub(_quote_wrapper, text)
-    return mark_safe(output)
-
-
-initial_quotes.is_safe = True
+    text = _text(text)
+    output = QUOTE_FINDER.sub(_quote_wrapper, text)
+    return output
 
 
 def smartypants(text):
@@ -136,7 +144,7 @@ def smartypants(text):
     >>> smartypants('The "Green" man')
     u'The &#8220;Green&#8221; man'
     """
-    text = force_unicode(text)
+    text = _text(text)
     try:
         from . import smartypants
     except ImportError:
@@ -144,12 +152,10 @@ def smartypants(text):
                         "The Python smartypants library isn't installed.")
     else:
         output = smartypants.smartyPants(text)
-        return mark_safe(output)
-
-
-smartypants.is_safe = True
+        return output
 
 
+@profiled('typogrify')
 def typogrify(text):
     """
     The super typography filter
@@ -157,7 +163,7 @@ def typogrify(text):
     Applies the following filters: widont, smartypants, caps, amp,
     initial_quotes
     """
-    text = force_unicode(text)
+    text = _text(text)
     text = amp(text)
     text = widont(text)
     text = smartypants(text)
@@ -206,23 +212,16 @@ def widont(text):
     >>> widont('<div><p>But divs with paragraphs do!</p></div>')
     u'<div><p>But divs with paragraphs&nbsp;do!</p></div>'
     """
-    text = force_unicode(text)
-    widont_finder = re.compile(r"""((?:</?(?:a|em|span|strong|i|b)[^>]*>)|[^<>\s])
-                                   \s+
-                                   ([^<>\s]+
-                                   \s*
-                                   (</(a|em|span|strong|i|b)>\s*)*
-                                   ((</(p|h[1-6]|li|dt|dd)>)|$))
-                                   """, re.VERBOSE)
-    output = widont_finder.sub(r'\1&nbsp;\2', text)
-    return mark_safe(output)
-
-
-widont.is_safe = True
-
-register.filter('amp', amp)
-register.filter('caps', caps)
-register.filter('initial_quotes', initial_quotes)
-register.filter('smartypants', smartypants)
-register.filter('typogrify', typogrify)
-register.filter('widont', widont)
+    text = _text(text)
+    output = WIDONT_FINDER.sub(r'\1&nbsp;\2', text)
+    return output
+
+
+FILTERS = {
+    'amp': amp,
+    'caps': caps,
+    'initial_quotes': initial_quotes,
+    'smartypants': smartypants,
+    'typogrify': typogrify,
+    'widont': widont,
+}
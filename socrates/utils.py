@@ -1,4 +1,19 @@
+import os
 import re
+import tempfile
+import threading
+
+
+# mkstemp creates private files, published ones should honour the umask.
+# Read once, when it's first needed, see ``_get_umask``.
+_umask = None
+_umask_lock = threading.Lock()
+
+# Words and tags as seen by Django's truncatewords_html
+_html_words = re.compile(r'<.*?>|((?:\w[-\w]*|&.*?;)+)', re.U | re.S)
+_html_tag = re.compile(r'<(/)?([^ ]+?)(?:(\s*/)| .*?)?>', re.S)
+_html4_singlets = ('br', 'col', 'link', 'base', 'img', 'param', 'area', 'hr',
+                   'input')
 
 
 def slugify(value):
@@ -6,6 +21,14 @@ def slugify(value):
     return re.sub('[-\s]+', '-', value)
 
 
+def load_yaml(text):
+    """
+    Parse YAML, with libyaml when it's available.
+    """
+    import yaml
+    return yaml.load(text, Loader=getattr(yaml, 'CLoader', yaml.Loader))
+
+
 def ligatures(text):
     # TODO: Georgia doesn't like the following three.
     # text = text.replace('ft', '&#xFB05;')
@@ -14,3 +37,92 @@ def ligatures(text):
     text = text.replace('fl', '&#xFB02;')
     text = text.replace('fi', '&#xFB01;')
     return text
+
+
+def truncate_html_words(text, length, truncate=' ...'):
+    """
+    Truncate HTML to ``length`` words and close the tags left open. Gives
+    the same result as Django's ``truncatewords_html`` filter.
+    """
+    if length <= 0:
+        return ''
+    pos = 0
+    end_text_pos = 0
+    words = 0
+    open_tags = []
+    while words <= length:
+        m = _html_words.search(text, pos)
+        if not m:
+            break
+        pos = m.end(0)
+        if m.group(1):
+            words += 1
+            if words == length:
+                end_text_pos = pos
+            continue
+        tag = _html_tag.match(m.group(0))
+        if not tag or words >= length:
+            # Don't worry about non tags or tags after the truncate point
+            continue
+        closing_tag, tagname, self_closing = tag.groups()
+        tagname = tagname.lower()
+        if self_closing or tagname in _html4_singlets:
+            pass
+        elif closing_tag:
+            # An end tag closes all unclosed intervening start tags too
+            try:
+                i = open_tags.index(tagname)
+            except ValueError:
+                pass
+            else:
+                open_tags = open_tags[i + 1:]
+        else:
+            open_tags.insert(0, tagname)
+
+    if words <= length:
+        return text
+    out = text[:end_text_pos] + truncate
+    for tag in open_tags:
+        out += '</%s>' % tag
+    return out
+
+
+def _get_umask():
+    """
+    Return the process umask. It can only be read by setting it, so that's
+    done just once.
+    """
+    global _umask
+    with _umask_lock:
+        if _umask is None:
+            _umask = os.umask(0)
+            os.umask(_umask)
+        return _umask
+
+
+def write_file(path, contents):
+    """
+    Write ``contents`` (bytes) to ``path`` unless the file already holds
+    exactly that. The new file is written next to the old one and moved into
+    place, so readers never see a half written file. Returns ``True`` when
+    the file has been written.
+    """
+    try:
+        if os.path.getsize(path) == len(contents):
+            with open(path, 'rb') as f:
+                if f.read() == contents:
+                    return False
+    except (IOError, OSError):
+        pass
+
+    directory, name = os.path.split(path)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.%s.' % name)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(contents)
+        os.chmod(tmp, 0o666 & ~_get_umask())
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return True
@@ -0,0 +1,271 @@
+"""
+Watch a site for changes and rebuild it. Uses inotify on Linux and falls
+back to polling modification times everywhere else.
+"""
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import traceback
+
+
+# Directories of a site that are watched, ``config.yaml`` is watched too
+WATCHED = ['posts', 'pages', 'layout']
+CONFIG = 'config.yaml'
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+EVENT = struct.Struct('iIII')
+
+# Returned by ``wait`` when changes may have been missed, the whole site has
+# to be looked at again
+OVERFLOW = object()
+
+
+def _ignored(name):
+    # Editor swap and backup files
+    return name.startswith('.') or name.endswith('~')
+
+
+class PollingWatcher(object):
+    """
+    Compares the modification times of all watched files every
+    ``interval`` seconds.
+    """
+
+    def __init__(self, root, interval=0.5):
+        self.root = root
+        self.interval = interval
+        self.files = self.scan()
+
+    def scan(self):
+        files = {}
+        paths = [os.path.join(self.root, CONFIG)]
+        for name in WATCHED:
+            for dirpath, dirnames, filenames in os.walk(
+                    os.path.join(self.root, name)):
+                dirnames[:] = [d for d in dirnames if not _ignored(d)]
+                paths.extend(os.path.join(dirpath, f) for f in filenames
+                             if not _ignored(f))
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files[path] = (st.st_mtime, st.st_size)
+        return files
+
+    def wait(self, timeout=None):
+        """
+        Return the paths that have changed, waiting at most ``timeout``
+        seconds (forever if it's ``None``) for the first change.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            files = self.scan()
+            changed = set(files) ^ set(self.files)
+            changed.update(p for p in files
+                           if p in self.files and files[p] != self.files[p])
+            self.files = files
+            if changed:
+                return changed
+            if deadline is not None and time.time() >= deadline:
+                return set()
+            delay = self.interval
+            if deadline is not None:
+                delay = min(delay, max(deadline - time.time(), 0))
+            time.sleep(delay)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Watches the site through inotify, using libc directly via ctypes.
+    """
+
+    MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+            IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF |
+            IN_MOVE_SELF)
+
+    def __init__(self, root):
+        import ctypes
+        import ctypes.util
+
+        self.root = root
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'),
+                                use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            self._error()
+        self.watches = {}
+        self.add(root, recursive=False)
+        for name in WATCHED:
+            self.add(os.path.join(root, name))
+
+    def _error(self, path=None):
+        import ctypes
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code), path)
+
+    def add(self, path, recursive=True):
+        if not os.path.isdir(path):
+            return
+        wd = self.libc.inotify_add_watch(self.fd, path.encode('utf-8'),
+                                         self.MASK)
+        if wd < 0:
+            self._error(path)
+        self.watches[wd] = path
+        if recursive:
+            for name in os.listdir(path):
+                sub = os.path.join(path, name)
+                if not _ignored(name) and os.path.isdir(sub):
+                    self.add(sub)
+
+    def _relevant(self, path):
+        rel = os.path.relpath(path, self.root)
+        parts = rel.split(os.sep)
+        if any(_ignored(p) for p in parts):
+            return False
+        if len(parts) == 1:
+            return parts[0] in WATCHED or parts[0] == CONFIG
+        return parts[0] in WATCHED
+
+    def wait(self, timeout=None):
+        """
+        Return the paths that have changed, waiting at most ``timeout``
+        seconds (forever if it's ``None``) for the first change. Returns
+        ``OVERFLOW`` when the kernel had to drop events.
+        """
+        try:
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+        except (OSError, select.error) as e:
+            if e.args[0] == errno.EINTR:
+                return set()
+            raise
+        if not ready:
+            return set()
+
+        changed = set()
+        overflow = False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return changed
+            raise
+
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, length = EVENT.unpack_from(data, pos)
+            pos += EVENT.size
+            name = data[pos:pos + length].rstrip(b'\0').decode('utf-8')
+            pos += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events have been dropped, also the creation of directories
+                # we should be watching
+                for watched in WATCHED:
+                    self.add(os.path.join(self.root, watched))
+                overflow = True
+                continue
+
+            directory = self.watches.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                del self.watches[wd]
+                continue
+            path = os.path.join(directory, name) if name else directory
+            if not self._relevant(path):
+                continue
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self.add(path)
+            changed.add(path)
+        if overflow:
+            return OVERFLOW
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def get_watcher(root):
+    """
+    Return an inotify watcher if the platform has one, a polling watcher
+    otherwise.
+    """
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError, TypeError):
+            pass
+    return PollingWatcher(root)
+
+
+def watch(generator, debounce=0.2, callback=None):
+    """
+    Rebuild the site of ``generator`` whenever something changes. Changes
+    are collected until nothing has happened for ``debounce`` seconds, so
+    that saving several files at once leads to a single rebuild. The build
+    is told which files have changed and doesn't look at the others, see
+    ``Generator.build``, unless the watcher may have missed some.
+    ``callback`` is called with the generator after every rebuild.
+    """
+    watcher = get_watcher(generator.ROOT)
+    generator.log('Watching %s for changes, press Ctrl+C to stop.'
+                  % generator.ROOT)
+    try:
+        while True:
+            changed = watcher.wait()
+            if not changed:
+                continue
+            while True:
+                more = watcher.wait(debounce)
+                if not more:
+                    break
+                if more is OVERFLOW or changed is OVERFLOW:
+                    changed = OVERFLOW
+                else:
+                    changed.update(more)
+
+            if changed is OVERFLOW:
+                generator.log('Too many changes, checking every file.')
+                changed = None
+            else:
+                for path in sorted(changed):
+                    generator.log('Changed: %s' % os.path.relpath(
+                        path, generator.ROOT))
+            start = time.time()
+            try:
+                generator.build(changed)
+            except SystemExit:
+                # The error has been reported, wait for it to be fixed
+                continue
+            except Exception:
+                traceback.print_exc()
+                continue
+            generator.log('Rebuilt in %.2fs' % (time.time() - start))
+            if callback is not None:
+                callback(generator)
+    except KeyboardInterrupt:
+        generator.log('\nAll done!')
+    finally:
+        watcher.close()